@@ -1,61 +1,816 @@
+import asyncio
+import concurrent.futures
 import copy
-from typing import Any, MutableMapping, MutableSequence, Union
+import fnmatch
+import itertools
+import os
+import re
+import time
+from typing import Any, MutableMapping, MutableSequence, Union, List, Optional, Sequence, Dict, Iterable, \
+    Iterator, Pattern, Callable
 
-from .data import DataGetValue, Data, BaseData
-from .exception import InvalidOperationError
+from .data import DataGetValue, Data, BaseData, AsyncData, ValueData
+from .exception import InvalidOperationError, BuildError
+
+
+class _BuildRemove:
+    """Marker type for items that must be removed from their container."""
+    def __repr__(self) -> str:
+        return 'BUILD_REMOVE'
+
+
+BUILD_REMOVE: Any = _BuildRemove()
+"""Returned by :func:`DataBuilder.build_item` when the item must be removed from its container."""
+
+
+_NOT_BUILT = object()
+
+# Sequences with more removed items than this are compacted in a single pass.
+_COMPACT_THRESHOLD = 8
+
+# Leaf types that can never contain or be Data, and are skipped without further checks.
+_SCALAR_TYPES = frozenset([str, int, float, bool, bytes, type(None)])
+
+
+def _is_container(value: Any) -> bool:
+    """Whether the value is a Mapping or Sequence that must be traversed by :class:`DataBuilder`."""
+    vtype = type(value)
+    if vtype is dict or vtype is list:
+        return True
+    if vtype in _SCALAR_TYPES:
+        return False
+    return isinstance(value, (MutableMapping, MutableSequence))
+
+
+class _BuildFrame:
+    """
+    A reference to a container being built by :class:`DataBuilder`.
+
+    When not building in place, *result* is only set when the container is first changed, by
+    :func:`materialize`, which also copies all the parent containers up to the root.
+    """
+    __slots__ = ('source', 'result', 'parent', 'key', 'pruned')
+
+    def __init__(self, source: Any, parent: Optional['_BuildFrame'], key: Any, in_place: bool):
+        self.source = source
+        # None until materialized
+        self.result: Any = source if in_place else None
+        self.parent = parent
+        self.key = key
+        self.pruned: Optional[List[Any]] = None
+
+    def materialize(self) -> Any:
+        """
+        Returns the container that receives the changes, shallow-copying it and its parents if needed.
+        """
+        pending: List[_BuildFrame] = []
+        frame: Optional[_BuildFrame] = self
+        while frame is not None and frame.result is None:
+            pending.append(frame)
+            frame = frame.parent
+        for frame in reversed(pending):
+            frame.result = _shallow_copy(frame.source)
+            if frame.parent is not None:
+                frame.parent.result[frame.key] = frame.result
+        return self.result
+
+    def path(self) -> str:
+        """
+        Returns the dotted path of this container from the root.
+        """
+        keys: List[str] = []
+        frame: Optional[_BuildFrame] = self
+        while frame is not None and frame.parent is not None:
+            keys.append(str(frame.key))
+            frame = frame.parent
+        return '.'.join(reversed(keys))
+
+    def item_path(self, key: Any) -> str:
+        """
+        Returns the dotted path of an item of this container from the root.
+        """
+        path = self.path()
+        if path == '':
+            return str(key)
+        return '{}.{}'.format(path, key)
+
+    def prune(self, key: Any) -> None:
+        """
+        Marks a child container to be removed when this container is closed.
+        """
+        if self.pruned is None:
+            self.pruned = []
+        self.pruned.append(key)
+
+
+class BuildStats:
+    """
+    Statistics of a single :func:`DataBuilder.build` call, reported to a :class:`BuildObserver`.
+
+    The statistics of the root object include everything. *keys* contains the statistics attributed to each
+    top-level key of the root, if it is a Mapping, or each index, if it is a Sequence. Containers shared
+    between top-level keys are attributed to the first key that visits them.
+    """
+    nodes: int
+    """Number of containers (Mappings and Sequences) visited."""
+    items: int
+    """Number of items in the visited containers."""
+    data_resolved: int
+    """Number of :class:`Data` instances resolved, once for each distinct instance, except the ones whose
+    value is a Mapping or Sequence, which are resolved at each location."""
+    option_lookups: int
+    """Number of distinct :class:`kubragen2.option.Option` instances resolved."""
+    removed: int
+    """Number of items removed, including pruned ones."""
+    duration: float
+    """Wall time in seconds."""
+    keys: Dict[Any, 'BuildStats']
+
+    def __init__(self):
+        self.nodes = 0
+        self.items = 0
+        self.data_resolved = 0
+        self.option_lookups = 0
+        self.removed = 0
+        self.duration = 0.0
+        self.keys = {}
+
+    def add(self, stats: 'BuildStats') -> None:
+        """
+        Adds the counters of another statistics to these.
+        """
+        self.nodes += stats.nodes
+        self.items += stats.items
+        self.data_resolved += stats.data_resolved
+        self.option_lookups += stats.option_lookups
+        self.removed += stats.removed
+        self.duration += stats.duration
+
+
+class BuildObserver:
+    """
+    Receives statistics from :class:`DataBuilder`. When no observer is set, no statistics are collected.
+    """
+    def build_finished(self, stats: BuildStats) -> None:
+        """
+        Called at the end of each :func:`DataBuilder.build` call that builds a container.
+
+        :param stats: the build statistics
+        """
+        pass
+
+
+class _BuildContext:
+    """
+    The state of a single :func:`DataBuilder.build` call.
+
+    *frames* maps the id of each container to the frame where it was first visited, and *values* maps the
+    id of each item passed to :func:`DataBuilder.build_item` to its result, if it is not a container.
+    *built* keeps these items alive so their ids are not reused during the build.
+    *prune_keep* is set only in prune mode.
+    *stats* is set only if there is an observer, and is the statistics of the top-level key being built.
+    """
+    __slots__ = ('in_place', 'prune_keep', 'stack', 'frames', 'values', 'built', 'build_item', 'stats',
+                 'stats_time')
+
+    def __init__(self, in_place: bool, prune_keep: Optional[Pattern[str]], build_item: Callable[[Any], Any]):
+        self.in_place = in_place
+        self.prune_keep = prune_keep
+        self.stack: List[_BuildFrame] = []
+        self.frames: Dict[int, _BuildFrame] = {}
+        self.values: Dict[int, Any] = {}
+        self.built: List[Any] = []
+        self.build_item = build_item
+        self.stats: Optional[BuildStats] = None
+        self.stats_time = 0.0
+
+    def switch_stats(self, stats: BuildStats) -> None:
+        """
+        Starts attributing the statistics to another top-level key.
+        """
+        now = time.perf_counter()
+        if self.stats is not None:
+            self.stats.duration += now - self.stats_time
+        self.stats = stats
+        self.stats_time = now
+
+    def current_stats(self) -> BuildStats:
+        """
+        Returns the statistics being collected, if there is an observer.
+        """
+        stats = self.stats
+        if stats is None:
+            raise InvalidOperationError('Build statistics are not being collected')
+        return stats
+
+    def can_prune(self, frame: _BuildFrame, key: Any) -> bool:
+        """
+        Whether an empty or None item of the container can be pruned.
+        """
+        return self.prune_keep is not None and self.prune_keep.fullmatch(frame.item_path(key)) is None
+
+
+def _shallow_copy(data: Any) -> Any:
+    dtype = type(data)
+    if dtype is dict:
+        return data.copy()
+    if dtype is list:
+        return data[:]
+    return copy.copy(data)
+
+
+def _compact_sequence(data: MutableSequence, removed: List[int]) -> None:
+    """
+    Removes the items at the indexes in *removed*, which must be in descending order.
+
+    Lists with many removals are rebuilt in a single pass using slice assignment, so aliases of the list see
+    the change, instead of shifting the remaining items on each removal.
+    """
+    if type(data) is not list or len(removed) <= _COMPACT_THRESHOLD:
+        for index in removed:
+            del data[index]
+        return
+    keep = bytearray(b'\x01') * len(data)
+    for index in removed:
+        keep[index] = 0
+    data[:] = list(itertools.compress(data, keep))
+
+
+PRUNE_KEEP_DEFAULT: Sequence[str] = ('emptyDir', '*.emptyDir')
+"""Paths that are never pruned by default, where empty values are meaningful."""
 
 
 class DataBuilder:
+    """
+    Builds data, replacing :class:`Data` instances by its value, or removing them if disabled.
+
+    :param prune: whether to remove the empty Mappings and Sequences and the None values left after building
+    :param prune_keep: list of :mod:`fnmatch` patterns of dotted paths that are never pruned, where empty
+        values are meaningful. Sequence items use the index as path. Defaults to :data:`PRUNE_KEEP_DEFAULT`.
+    :param observer: an observer that receives the statistics of each build
+    """
+    prune: bool
+    prune_keep: Sequence[str]
+    observer: Optional[BuildObserver]
+
+    def __init__(self, prune: bool = False, prune_keep: Optional[Sequence[str]] = None,
+                 observer: Optional[BuildObserver] = None):
+        self.prune = prune
+        self.prune_keep = prune_keep if prune_keep is not None else PRUNE_KEEP_DEFAULT
+        self.observer = observer
+
+    def build_item(self, value: Any) -> Any:
+        """
+        Builds a single Mapping or Sequence item. Scalar items (str, int, float, bool, bytes, None) and
+        dict / list items are never passed to this method. It is called only once for each distinct item
+        instance during a build, except for items whose value is a Mapping or Sequence, which are built again at
+        each location so the locations don't share the same container.
+
+        :param value: the item value
+        :return: the new item value, or :data:`BUILD_REMOVE` if the item must be removed from its container
+        :raises InvalidOperationError: if the value is a :class:`BaseData` that is not a :class:`Data`
+        """
+        if isinstance(value, BaseData):
+            if isinstance(value, Data):
+                if not value.is_enabled():
+                    return BUILD_REMOVE
+                return value.get_value()
+            raise InvalidOperationError('Cannot use BaseData in build')
+        return value
+
+    def build_item_observed(self, value: Any, stats: BuildStats) -> Any:
+        """
+        Same as :func:`build_item`, updating the statistics. Used instead of it when there is an observer.
+
+        :param value: the item value
+        :param stats: the statistics to update
+        :return: the new item value, or :data:`BUILD_REMOVE` if the item must be removed from its container
+        """
+        if isinstance(value, Data):
+            stats.data_resolved += 1
+        return self.build_item(value)
+
     def build_prop(self, data: Union[MutableMapping, MutableSequence], key: Any) -> None:
         """
         Cleanup instances of Data class in Mapping or Sequence.
+
+        If a subclass overrides this method, :func:`build` calls it for every item of every container, like
+        in the previous versions, instead of the single-pass traversal. Pruning and statistics are not
+        supported in this case.
         """
-        if isinstance(data[key], BaseData):
-            if isinstance(data[key], Data):
-                if not data[key].is_enabled():
-                    del data[key]
-                else:
-                    data[key] = data[key].get_value()
-            else:
-                raise InvalidOperationError('Cannot use BaseData in build')
+        value = data[key]
+        newvalue = self.build_item(value)
+        if newvalue is BUILD_REMOVE:
+            del data[key]
+        elif newvalue is not value:
+            data[key] = newvalue
 
     def build(self, data: Any, in_place: bool = True) -> Any:
         """
         Cleanup all instances of Data classes, removing if not enabled or replacing by its value.
 
+        The traversal uses an explicit stack, so arbitrarily deep data does not hit the recursion limit.
+        Each distinct item instance is built only once, except if its value is a Mapping or Sequence, and each
+        container referenced from multiple places is traversed only once, during a single call.
+
         :param data: the data to mutate
-        :param in_place: whether to modify the data in-place. If False, data will be duplicated
-            using copy.deepcopy
+        :param in_place: whether to modify the data in-place. If False, the input is not modified, and only the
+            containers in the path from the root to each replaced or removed item are copied, all other
+            containers are shared between the input and the result
         :return: the same value passed, mutated, except if it is *Data{enabled=False}*, in this case it returns None.
+        :raises InvalidOperationError: if a container contains itself
         """
-        if not in_place:
-            data = copy.deepcopy(data)
-        if isinstance(data, MutableMapping):
-            keylist = list(data.keys())
-            for key in keylist:
-                self.build_prop(data, key)
-            for item in data.values():
-                self.build(item)
-            return data
-        elif isinstance(data, MutableSequence):
-            for key in range(len(data) - 1, -1, -1):
-                self.build_prop(data, key)
-            for item in data:
-                self.build(item)
+        if not _is_container(data):
+            return self.get_value(data)
+        if type(self).build_prop is not DataBuilder.build_prop:
+            if not in_place:
+                data = copy.deepcopy(data)
+            self._build_props(data)
             return data
-        return self.get_value(data)
+        root = _BuildFrame(data, None, None, in_place)
+        prune_keep: Optional[Pattern[str]] = None
+        if self.prune:
+            prune_keep = re.compile('|'.join(fnmatch.translate(pattern) for pattern in self.prune_keep) or '(?!)')
+        context = _BuildContext(in_place, prune_keep, self.build_item)
+        observer = self.observer
+        if observer is not None:
+            stats = BuildStats()
+            context.switch_stats(stats)
+            context.build_item = lambda value: self.build_item_observed(value, context.current_stats())
+        stack = context.stack
+        frames = context.frames
+        stack.append(root)
+        while stack:
+            frame = stack.pop()
+            current = frames.get(id(frame.source))
+            if current is None:
+                frames[id(frame.source)] = frame
+                if observer is not None:
+                    if frame.parent is root:
+                        context.switch_stats(stats.keys.setdefault(frame.key, BuildStats()))
+                    current_stats = context.current_stats()
+                    current_stats.nodes += 1
+                    current_stats.items += len(frame.source)
+                if prune_keep is not None:
+                    # in prune mode the frame is pushed again, to be closed after all its children
+                    stack.append(frame)
+                self._build_container(frame, context)
+                continue
+            if current is frame:
+                self._close_container(frame, context)
+                continue
+            # a container that was already visited, either shared or one of its own ancestors
+            ancestor = frame.parent
+            while ancestor is not None:
+                if ancestor is current:
+                    raise InvalidOperationError('Cyclic reference detected at "{}"'.format(frame.path()))
+                ancestor = ancestor.parent
+            if prune_keep is not None and frame.parent is not None and \
+                    len(current.result if current.result is not None else current.source) == 0:
+                if context.can_prune(frame.parent, frame.key):
+                    frame.parent.prune(frame.key)
+                    continue
+            if current.result is not None and current.result is not current.source and frame.parent is not None:
+                # a shared container that was copied on its first visit
+                frame.parent.materialize()[frame.key] = current.result
+        if observer is not None:
+            context.switch_stats(stats)
+            for key_stats in stats.keys.values():
+                stats.add(key_stats)
+            observer.build_finished(stats)
+        return root.result if root.result is not None else data
+
+    def _build_container(self, frame: _BuildFrame, context: _BuildContext) -> None:
+        """
+        Builds all items of a single Mapping or Sequence, pushing the child containers to the stack
+        so they are visited in the same order as a recursive depth-first traversal.
+        """
+        build_item = context.build_item
+        in_place = context.in_place
+        prune = context.prune_keep is not None
+        values = context.values
+        built = context.built
+        data = frame.source
+        result = frame.result
+        children: List[_BuildFrame] = []
+        dtype = type(data)
+        if dtype is dict or (dtype is not list and isinstance(data, MutableMapping)):
+            removed: List[Any] = []
+            for key, value in list(data.items()):
+                vtype = type(value)
+                if vtype in _SCALAR_TYPES:
+                    if prune and value is None and context.can_prune(frame, key):
+                        removed.append(key)
+                    continue
+                if vtype is dict or vtype is list:
+                    children.append(_BuildFrame(value, frame, key, in_place))
+                    continue
+                newvalue = values.get(id(value), _NOT_BUILT)
+                if newvalue is _NOT_BUILT:
+                    newvalue = build_item(value)
+                    # container values are not shared between locations, they are resolved again for each one
+                    if not _is_container(newvalue):
+                        values[id(value)] = newvalue
+                        built.append(value)
+                if newvalue is BUILD_REMOVE or (prune and newvalue is None and context.can_prune(frame, key)):
+                    removed.append(key)
+                    continue
+                if newvalue is not value:
+                    if result is None:
+                        result = frame.materialize()
+                    result[key] = newvalue
+                if _is_container(newvalue):
+                    children.append(_BuildFrame(newvalue, frame, key, in_place))
+            if removed:
+                if result is None:
+                    result = frame.materialize()
+                for key in removed:
+                    del result[key]
+                if context.stats is not None:
+                    context.stats.removed += len(removed)
+            children.reverse()
+        else:
+            # sequence items are processed from the end, and removed items are compacted in a single pass at the end
+            removed_indexes: List[int] = []
+            for index in range(len(data) - 1, -1, -1):
+                value = data[index]
+                vtype = type(value)
+                if vtype in _SCALAR_TYPES:
+                    if prune and value is None and context.can_prune(frame, index):
+                        removed_indexes.append(index)
+                    continue
+                if vtype is dict or vtype is list:
+                    children.append(_BuildFrame(value, frame, index + len(removed_indexes), in_place))
+                    continue
+                newvalue = values.get(id(value), _NOT_BUILT)
+                if newvalue is _NOT_BUILT:
+                    newvalue = build_item(value)
+                    # container values are not shared between locations, they are resolved again for each one
+                    if not _is_container(newvalue):
+                        values[id(value)] = newvalue
+                        built.append(value)
+                if newvalue is BUILD_REMOVE or (prune and newvalue is None and context.can_prune(frame, index)):
+                    removed_indexes.append(index)
+                    continue
+                if newvalue is not value:
+                    if result is None:
+                        result = frame.materialize()
+                    result[index] = newvalue
+                if _is_container(newvalue):
+                    # the key is fixed below, when the number of removals before this item is known
+                    children.append(_BuildFrame(newvalue, frame, index + len(removed_indexes), in_place))
+            if removed_indexes:
+                if result is None:
+                    result = frame.materialize()
+                _compact_sequence(result, removed_indexes)
+                for child in children:
+                    child.key -= len(removed_indexes)
+                if context.stats is not None:
+                    context.stats.removed += len(removed_indexes)
+        context.stack.extend(children)
+
+    def _build_props(self, data: Any) -> None:
+        """
+        Calls :func:`build_prop` for every item of every container, for subclasses that override it.
+        Each container is visited only once.
+        """
+        seen = set()
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if id(item) in seen:
+                continue
+            if isinstance(item, MutableMapping):
+                seen.add(id(item))
+                for key in list(item.keys()):
+                    self.build_prop(item, key)
+                children = list(item.values())
+            elif isinstance(item, MutableSequence):
+                seen.add(id(item))
+                for key in range(len(item) - 1, -1, -1):
+                    self.build_prop(item, key)
+                children = list(item)
+            else:
+                continue
+            children.reverse()
+            stack.extend(children)
+
+    def _close_container(self, frame: _BuildFrame, context: _BuildContext) -> None:
+        """
+        Called in prune mode after all the children of the container were built, removes the pruned children,
+        and marks the container to be pruned from its parent if it is empty.
+        """
+        result = frame.result
+        if frame.pruned is not None:
+            if result is None:
+                result = frame.materialize()
+            if isinstance(result, MutableMapping):
+                for key in frame.pruned:
+                    del result[key]
+            else:
+                _compact_sequence(result, sorted(frame.pruned, reverse=True))
+            if context.stats is not None:
+                context.stats.removed += len(frame.pruned)
+        if frame.parent is not None and len(result if result is not None else frame.source) == 0 and \
+                context.can_prune(frame.parent, frame.key):
+            frame.parent.prune(frame.key)
 
     def get_value(self, data: Any) -> Any:
         return DataGetValue(data)
 
 
-def BuildData(data: Any, in_place: bool = True) -> Any:
+def BuildData(data: Any, in_place: bool = True, prune: bool = False,
+              prune_keep: Optional[Sequence[str]] = None, observer: Optional[BuildObserver] = None) -> Any:
     """
     Cleanup all instances of Data classes, removing if not enabled or replacing by its value.
 
     :param data: the data to mutate
-    :param in_place: whether to modify the data in-place. If False, data will be duplicated
-        using copy.deepcopy
+    :param in_place: whether to modify the data in-place. If False, the input is not modified, and only the
+        containers in the path from the root to each replaced or removed item are copied
+    :param prune: whether to remove the empty Mappings and Sequences and the None values left after building
+    :param prune_keep: list of :mod:`fnmatch` patterns of dotted paths that are never pruned.
+        Defaults to :data:`PRUNE_KEEP_DEFAULT`.
+    :param observer: an observer that receives the build statistics
     :return: the same value passed, mutated, except if it is *Data{enabled=False}*, in this case it returns None.
     """
-    return DataBuilder().build(data, in_place=in_place)
+    return DataBuilder(prune=prune, prune_keep=prune_keep, observer=observer).build(data, in_place=in_place)
+
+
+def _find_async_data(data: Any) -> List[AsyncData]:
+    """
+    Finds the unresolved and enabled :class:`AsyncData` instances in the data, including the values of enabled
+    :class:`ValueData` instances, but not the values of other :class:`Data` classes.
+    """
+    ret: List[AsyncData] = []
+    seen: Dict[int, Any] = {}
+    stack: List[Any] = [data]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen[id(value)] = value
+        if isinstance(value, AsyncData):
+            if not value.resolved and value.is_enabled():
+                ret.append(value)
+        elif isinstance(value, ValueData):
+            if value.is_enabled():
+                stack.append(value.value)
+        elif _is_container(value):
+            stack.extend(value.values() if isinstance(value, MutableMapping) else value)
+    return ret
+
+
+async def AsyncBuildData(data: Any, in_place: bool = True, builder: Optional[DataBuilder] = None,
+                         concurrency: int = 10) -> Any:
+    """
+    Resolves all :class:`AsyncData` instances concurrently, then builds the data with the builder.
+
+    :class:`AsyncData` instances inside resolved :class:`AsyncData` values and inside enabled :class:`ValueData`
+    values are also resolved, but not ones inside the values of other :class:`Data` classes.
+
+    :param data: the data to build
+    :param in_place: whether to modify the data in-place, same as :func:`BuildData`
+    :param builder: the builder to use, by default a :class:`DataBuilder`
+    :param concurrency: maximum number of :class:`AsyncData` values being resolved at the same time
+    :return: the built data
+    """
+    if builder is None:
+        builder = DataBuilder()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(item: AsyncData) -> None:
+        async with semaphore:
+            await item.resolve()
+
+    pending = _find_async_data(data)
+    while pending:
+        await asyncio.gather(*[resolve(item) for item in pending])
+        pending = _find_async_data([item.resolved_value for item in pending])
+    return builder.build(data, in_place=in_place)
+
+
+def IterBuildData(data: Iterable[Any], in_place: bool = True, builder: Optional[DataBuilder] = None) -> Iterator[Any]:
+    """
+    Builds an iterable of documents, yielding each one as soon as it is built, so only one document
+    needs to be in memory at a time.
+
+    The result can be passed directly to :func:`kubragen2.output.OutputFile.extend`.
+
+    :param data: the documents to build, for example from :func:`yaml.load_all`
+    :param in_place: whether to modify the documents in-place, same as :func:`BuildData`
+    :param builder: the builder to use, by default a :class:`DataBuilder`
+    :return: an iterator of the built documents
+    :raises BuildError: if any document fails to build, with the index of the failed document
+    """
+    if builder is None:
+        builder = DataBuilder()
+    for index, item in enumerate(data):
+        try:
+            built = builder.build(item, in_place=in_place)
+        except Exception as e:
+            raise BuildError(index, e) from e
+        yield built
+
+
+def _build_batch_chunk(builder: DataBuilder, start: int, data: Sequence[Any], in_place: bool) -> List[Any]:
+    """
+    Builds a chunk of documents of :func:`BuildDataBatch`, attributing errors to the document index.
+    """
+    ret = []
+    for index, item in enumerate(data):
+        try:
+            ret.append(builder.build(item, in_place=in_place))
+        except BuildError:
+            raise
+        except Exception as e:
+            raise BuildError(start + index, e) from e
+    return ret
+
+
+def BuildDataBatch(data: Sequence[Any], in_place: bool = True, builder: Optional[DataBuilder] = None,
+                   executor: Optional[concurrent.futures.Executor] = None, max_workers: Optional[int] = None,
+                   use_processes: bool = True, serial_threshold: int = 16) -> List[Any]:
+    """
+    Builds a sequence of independent documents, in parallel using a :mod:`concurrent.futures` pool.
+
+    When using a process pool, the builder and the documents are pickled to the workers, so the input is never
+    modified and the results are always new objects, even if *in_place* is True.
+
+    :param data: the documents to build
+    :param in_place: whether to modify the documents in-place, same as :func:`BuildData`
+    :param builder: the builder to use, by default a :class:`DataBuilder`. Must be picklable for process pools.
+    :param executor: the executor to use. If None, a new pool is created and shut down for this call.
+    :param max_workers: the maximum number of workers of the created pool, defaults to the number of CPUs
+    :param use_processes: whether the created pool is a process pool. If False, a thread pool is used.
+    :param serial_threshold: batches smaller than this are built serially in the current thread
+    :return: the built documents, in the same order as the input
+    :raises BuildError: if any document fails to build, with the index of the first failed document
+    """
+    if builder is None:
+        builder = DataBuilder()
+    if len(data) < serial_threshold or (executor is None and max_workers == 1):
+        return _build_batch_chunk(builder, 0, data, in_place)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    chunksize = max(1, -(-len(data) // (max_workers * 4)))
+
+    def run(pool: concurrent.futures.Executor) -> List[Any]:
+        futures = [pool.submit(_build_batch_chunk, builder, start, data[start:start + chunksize], in_place)
+                   for start in range(0, len(data), chunksize)]
+        ret: List[Any] = []
+        for future in futures:
+            ret.extend(future.result())
+        return ret
+
+    if executor is not None:
+        return run(executor)
+    pool: concurrent.futures.Executor
+    if use_processes:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    with pool:
+        return run(pool)
+
+
+class _PlanNode:
+    """
+    A container of a :class:`BuildPlan` template that contains dynamic items, directly or in its children.
+
+    *slots* are the keys of the dynamic items of the container, and *children* the keys and nodes of the child
+    containers that contain dynamic items.
+    """
+    __slots__ = ('source', 'parent', 'key', 'closed', 'index', 'slots', 'children')
+
+    def __init__(self, source: Any, parent: Optional['_PlanNode'], key: Any):
+        self.source = source
+        self.parent = parent
+        self.key = key
+        self.closed = False
+        self.index = -1
+        self.slots: List[Any] = []
+        self.children: List[Any] = []
+
+    def path(self) -> str:
+        keys: List[str] = []
+        node: Optional[_PlanNode] = self
+        while node is not None and node.parent is not None:
+            keys.append(str(node.key))
+            node = node.parent
+        return '.'.join(reversed(keys))
+
+
+class BuildPlan:
+    """
+    A template compiled to the locations of its dynamic items, to be built many times, for example with
+    different :class:`kubragen2.options.Options`.
+
+    Dynamic items are the ones that a :class:`DataBuilder` passes to :func:`DataBuilder.build_item`, like
+    :class:`Data` and :class:`kubragen2.option.Option` instances. Building the plan only visits these
+    items and copies the containers in the path from the root to them. All other containers of the template are
+    shared between the template and all results, and must not be modified.
+
+    The template must not be modified after the plan is compiled.
+
+    :param template: the template data
+    :raises InvalidOperationError: if a container of the template contains itself
+    """
+    template: Any
+    _nodes: List[_PlanNode]
+
+    def __init__(self, template: Any):
+        self.template = template
+        self._nodes = []
+        if _is_container(template):
+            self._compile()
+
+    def _compile(self) -> None:
+        """
+        Finds the containers with dynamic items, storing them in depth-first post-order, so each node comes
+        after all its children.
+        """
+        nodes: Dict[int, _PlanNode] = {}
+        stack: List[Any] = [(self.template, None, None)]
+        while stack:
+            source, parent, key = stack.pop()
+            if source is None:
+                # the node was pushed to be closed after all its children
+                self._compile_close(parent, nodes)
+                continue
+            node = nodes.get(id(source))
+            if node is not None:
+                if not node.closed:
+                    raise InvalidOperationError('Cyclic reference detected at "{}"'.format(
+                        _PlanNode(source, parent, key).path()))
+                continue
+            node = _PlanNode(source, parent, key)
+            nodes[id(source)] = node
+            stack.append((None, node, None))
+            items = source.items() if isinstance(source, MutableMapping) else enumerate(source)
+            children = []
+            for ikey, value in items:
+                if type(value) in _SCALAR_TYPES:
+                    continue
+                if _is_container(value):
+                    node.children.append((ikey, value))
+                    children.append((value, node, ikey))
+                else:
+                    node.slots.append(ikey)
+            children.reverse()
+            stack.extend(children)
+
+    def _compile_close(self, node: _PlanNode, nodes: Dict[int, _PlanNode]) -> None:
+        node.closed = True
+        node.children = [(key, nodes[id(value)]) for key, value in node.children if nodes[id(value)].index >= 0]
+        if len(node.slots) > 0 or len(node.children) > 0:
+            node.index = len(self._nodes)
+            self._nodes.append(node)
+
+    def build(self, builder: Optional[DataBuilder] = None) -> Any:
+        """
+        Builds the template, returning the same result as :func:`DataBuilder.build` with *in_place=False*.
+
+        If the builder is in prune mode, overrides :func:`DataBuilder.build_prop` or has an observer, the whole
+        template is built by the builder, so the observer receives the statistics of the full build.
+
+        :param builder: the builder to use, by default a :class:`DataBuilder`
+        :return: the built data
+        """
+        if builder is None:
+            builder = DataBuilder()
+        if not _is_container(self.template):
+            return builder.get_value(self.template)
+        if builder.prune or builder.observer is not None or type(builder).build_prop is not DataBuilder.build_prop:
+            return builder.build(self.template, in_place=False)
+        if len(self._nodes) == 0:
+            return self.template
+        values: Dict[int, Any] = {}
+        results: List[Any] = []
+        for node in self._nodes:
+            source = node.source
+            result = _shallow_copy(source)
+            for key, child in node.children:
+                result[key] = results[child.index]
+            removed: List[Any] = []
+            for key in node.slots:
+                value = source[key]
+                newvalue = values.get(id(value), _NOT_BUILT)
+                if newvalue is _NOT_BUILT:
+                    newvalue = builder.build_item(value)
+                    if _is_container(newvalue):
+                        newvalue = builder.build(newvalue, in_place=False)
+                    else:
+                        values[id(value)] = newvalue
+                if newvalue is BUILD_REMOVE:
+                    removed.append(key)
+                else:
+                    result[key] = newvalue
+            if removed:
+                if isinstance(result, MutableMapping):
+                    for key in removed:
+                        del result[key]
+                else:
+                    _compact_sequence(result, sorted(removed, reverse=True))
+            results.append(result)
+        return results[-1]
@@ -1,13 +1,13 @@
-from typing import Any
+from typing import Any, Callable, Awaitable, Union
 
-from .exception import InvalidParamError
+from .exception import InvalidParamError, InvalidOperationError
 
 
 class BaseData:
     """
     Base class to represent configurable data.
     """
-    pass
+    __slots__ = ()
 
 
 class Data(BaseData):
@@ -15,6 +15,8 @@ class Data(BaseData):
     Base class to represent data that can be disabled by a flag.
     The :func:`get_value` function allows for dynamic code generation if needed.
     """
+    __slots__ = ()
+
     def is_enabled(self) -> bool:
         """
         Whether the data is enabled. If not, it will be removed by :func:`BuildData`.
@@ -31,13 +33,27 @@ class Data(BaseData):
 
 
 class DisabledData(Data):
-    """A :class:`Data` class that is always disabled."""
+    """
+    A :class:`Data` class that is always disabled.
+    It has no state, so the shared :data:`DISABLED_DATA` instance can be used instead of creating new ones.
+    """
+    __slots__ = ()
+
     def is_enabled(self) -> bool:
         return False
 
     def get_value(self) -> Any:
         return None
 
+    def __reduce_ex__(self, protocol):
+        if self is not DISABLED_DATA:
+            return super().__reduce_ex__(protocol)
+        return 'DISABLED_DATA'
+
+
+DISABLED_DATA = DisabledData()
+"""A shared :class:`DisabledData` instance."""
+
 
 class ValueData(Data):
     """
@@ -47,23 +63,117 @@ class ValueData(Data):
     :param enabled: whether the data is enabled
     :param disabled_if_none: set enabled=False if value is None
     """
+    __slots__ = ('value', 'enabled')
+
     def __init__(self, value: Any = None, enabled: bool = True, disabled_if_none: bool = False):
         self.value = value
         self.enabled = enabled
         if disabled_if_none and value is None:
             self.enabled = False
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not ValueData:
+            return super().__reduce_ex__(protocol)
+        return ValueData, (self.value, self.enabled)
+
+    def is_enabled(self) -> bool:
+        return self.enabled
+
+    def get_value(self) -> Any:
+        return self.value
+
+
+class LazyData(Data):
+    """
+    A :class:`Data` class whose value is computed by a zero-argument callable, only when it is first requested,
+    for example by :func:`kubragen2.build.BuildData` or :func:`DataGetValue`. The result is cached.
+
+    :param func: callable that returns the value
+    :param enabled: whether the data is enabled, or a zero-argument callable that returns it, also called only
+        when first requested
+    """
+    __slots__ = ('func', 'enabled', 'computed', 'value')
+
+    def __init__(self, func: Callable[[], Any], enabled: Union[bool, Callable[[], bool]] = True):
+        self.func = func
+        self.enabled = enabled
+        self.computed = False
+        self.value = None
+
     def is_enabled(self) -> bool:
+        if callable(self.enabled):
+            self.enabled = bool(self.enabled())
         return self.enabled
 
     def get_value(self) -> Any:
+        if not self.computed:
+            self.value = self.func()
+            self.computed = True
         return self.value
 
 
+class AsyncData(Data):
+    """
+    Base class for data whose value is computed by a coroutine, in :func:`get_value_async`.
+
+    The value must be resolved by :func:`kubragen2.build.AsyncBuildData` before the data is built, after that
+    :func:`get_value` returns it.
+    """
+    __slots__ = ('resolved', 'resolved_value')
+
+    def __init__(self):
+        self.resolved = False
+        self.resolved_value = None
+
+    async def get_value_async(self) -> Any:
+        """
+        Computes the value of the data.
+
+        :return: the data value
+        """
+        raise NotImplementedError()
+
+    async def resolve(self) -> None:
+        """
+        Computes and stores the value of the data, if not resolved yet.
+        """
+        if not self.resolved:
+            self.resolved_value = await self.get_value_async()
+            self.resolved = True
+
+    def get_value(self) -> Any:
+        if not self.resolved:
+            raise InvalidOperationError('AsyncData value was not resolved, use AsyncBuildData')
+        return self.resolved_value
+
+
+class AsyncCallableData(AsyncData):
+    """
+    A :class:`AsyncData` class that awaits a zero-argument async callable.
+
+    :param func: async callable that returns the value
+    :param enabled: whether the data is enabled
+    """
+    __slots__ = ('func', 'enabled')
+
+    def __init__(self, func: Callable[[], Awaitable[Any]], enabled: bool = True):
+        super().__init__()
+        self.func = func
+        self.enabled = enabled
+
+    def is_enabled(self) -> bool:
+        return self.enabled
+
+    async def get_value_async(self) -> Any:
+        return await self.func()
+
+
 class ValueConfiguration:
     """
     Value configuration
     """
+    __slots__ = ('value_path',)
+
     value_path: str
 
     def __init__(self, value_path: str):
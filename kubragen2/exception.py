@@ -1,3 +1,6 @@
+from typing import List
+
+
 class KG2Exception(Exception):
     pass
 
@@ -20,3 +23,38 @@ class MergeError(KG2Exception):
 
 class ConfigFileError(KG2Exception):
     pass
+
+
+class BuildError(KG2Exception):
+    """
+    Error building one of the documents of a batch.
+
+    :param index: the index of the document that failed
+    :param error: the original error
+    """
+    index: int
+    error: Exception
+
+    def __init__(self, index: int, error: Exception):
+        super().__init__('Error building document {}: {}'.format(index, repr(error)))
+        self.index = index
+        self.error = error
+
+    def __reduce__(self):
+        return self.__class__, (self.index, self.error)
+
+
+class OptionsSchemaError(InvalidParamError):
+    """
+    Options that don't match an options schema.
+
+    :param errors: the list of error messages
+    """
+    errors: List[str]
+
+    def __init__(self, errors: List[str]):
+        super().__init__('Invalid options: {}'.format('; '.join(errors)))
+        self.errors = errors
+
+    def __reduce__(self):
+        return self.__class__, (self.errors,)
@@ -1,5 +1,7 @@
 import copy
-from typing import Optional, Mapping, Any, Dict, Sequence, Type
+import itertools
+import weakref
+from typing import Optional, Mapping, Any, Dict, Sequence, Type, Tuple
 
 from .data import Data
 from .exception import InvalidParamError
@@ -10,7 +12,7 @@ class KData(Data):
     """
     Base data for Kubernetes objects
     """
-    pass
+    __slots__ = ()
 
 
 class KData_Manual(KData):
@@ -19,11 +21,18 @@ class KData_Manual(KData):
 
     :param merge_config: A Mapping to merge on the result.
     """
+    __slots__ = ('merge_config',)
+
     merge_config: Mapping[Any, Any]
 
     def __init__(self, merge_config: Mapping[Any, Any] = None):
         self.merge_config = merge_config
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not KData_Manual:
+            return super().__reduce_ex__(protocol)
+        return KData_Manual, (self.merge_config,)
+
 
 class KData_Value(KData):
     """
@@ -31,11 +40,18 @@ class KData_Value(KData):
 
     :param value: the data value
     """
+    __slots__ = ('value',)
+
     value: Any
 
     def __init__(self, value: Any):
         self.value = value
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not KData_Value:
+            return super().__reduce_ex__(protocol)
+        return KData_Value, (self.value,)
+
 
 class KData_ConfigMap(KData):
     """
@@ -44,6 +60,8 @@ class KData_ConfigMap(KData):
     :param configmapName: ConfigMap name
     :param configmapData: ConfigMap data name
     """
+    __slots__ = ('configmapName', 'configmapData')
+
     configmapName: str
     configmapData: str
 
@@ -51,6 +69,11 @@ class KData_ConfigMap(KData):
         self.configmapName = configmapName
         self.configmapData = configmapData
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not KData_ConfigMap:
+            return super().__reduce_ex__(protocol)
+        return KData_ConfigMap, (self.configmapName, self.configmapData)
+
 
 class KData_Secret(KData):
     """
@@ -59,6 +82,8 @@ class KData_Secret(KData):
     :param secretName: Secret name
     :param secretData: Secret data name
     """
+    __slots__ = ('secretName', 'secretData')
+
     secretName: str
     secretData: str
 
@@ -66,6 +91,11 @@ class KData_Secret(KData):
         self.secretName = secretName
         self.secretData = secretData
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not KData_Secret:
+            return super().__reduce_ex__(protocol)
+        return KData_Secret, (self.secretName, self.secretData)
+
 
 class KData_Env(KData):
     """
@@ -74,6 +104,8 @@ class KData_Env(KData):
     :param name: Env name
     :param value: Env value. Can be another :class:`KData`.
     """
+    __slots__ = ('name', 'value')
+
     name: str
     value: Any
 
@@ -81,6 +113,11 @@ class KData_Env(KData):
         self.name = name
         self.value = value
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not KData_Env:
+            return super().__reduce_ex__(protocol)
+        return KData_Env, (self.name, self.value)
+
 
 class KData_StorageClass(KData):
     """
@@ -88,11 +125,18 @@ class KData_StorageClass(KData):
 
     :param name: Storage class name
     """
+    __slots__ = ('name',)
+
     name: str
 
     def __init__(self, name: str):
         self.name = name
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not KData_StorageClass:
+            return super().__reduce_ex__(protocol)
+        return KData_StorageClass, (self.name,)
+
     def build(self) -> Mapping[Any, Any]:
         return {
             'apiVersion': 'storage.k8s.io/v1',
@@ -159,11 +203,35 @@ class KData_PersistentVolume_Request:
         return None
 
 
+def _claim_cache_snapshot(value: Any) -> Any:
+    """
+    Returns a copy of the Mappings and Sequences in the value as tuples, which compares equal to a later
+    snapshot only if their items didn't change. Other values are kept as-is.
+    """
+    if isinstance(value, Mapping):
+        return Mapping, tuple((k, _claim_cache_snapshot(v)) for k, v in value.items())
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return Sequence, tuple(_claim_cache_snapshot(v) for v in value)
+    return value
+
+
 class KData_PersistentVolume(KData):
     """
     A :class:`KData` that represents a Kubernetes PersistentVolume.
+
+    :func:`build` caches the information that :func:`build_claim` needs from the PersistentVolume for each
+    request object, so the claim doesn't build it again. The cache is invalidated if an attribute of this
+    instance, of the request, or of its configurations changes, including the items of their Mappings and
+    Sequences. Call :func:`clear_cache` if other objects they reference are changed in place.
     """
+    _claim_cache: 'weakref.WeakKeyDictionary[KData_PersistentVolume_Request, Tuple[Any, ...]]'
+
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
+        """
+        Builds the PersistentVolume, without the request *merge_config*.
+        The result can share values with the request, so only the dicts created by this method may be changed
+        in place, use :func:`kubragen2.private.merger.Merger.merged` to change the others.
+        """
         ret: Dict[Any, Any] = {
             'apiVersion': 'v1',
             'kind': 'PersistentVolume',
@@ -176,17 +244,97 @@ class KData_PersistentVolume(KData):
         if req.storageclassname is not None:
             ret['spec']['storageClassName'] = req.storageclassname
         if req.selector_labels is not None:
-            ret['metadata']['labels'] = req.selector_labels
+            ret['metadata']['labels'] = dict(req.selector_labels)
         if req.storage is not None:
             ret['spec']['capacity'] = {
                 'storage': req.storage,
             }
         if req.access_modes is not None:
-            ret['spec']['accessModes'] = req.access_modes
+            ret['spec']['accessModes'] = list(req.access_modes)
         return ret
 
     def build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        return merger.merge(copy.deepcopy(self.internal_build(req)), req.merge_config if req.merge_config is not None else {})
+        ret = merger.merged(self.internal_build(req),
+                             copy.deepcopy(req.merge_config) if req.merge_config is not None else {})
+        self._claim_cache_store(req, ret)
+        return ret
+
+    def claim_clears_storageclass(self, pv: Mapping[Any, Any]) -> bool:
+        """
+        Whether the claims of the built PersistentVolume must set an empty storage class, usually because it
+        references an existing volume.
+
+        :param pv: the built PersistentVolume
+        """
+        return False
+
+    def clear_cache(self, req: Optional[KData_PersistentVolume_Request] = None) -> None:
+        """
+        Clears the cached information used by :func:`build_claim`.
+
+        :param req: the request to clear, or None to clear all
+        """
+        cache = self._claim_cache_get()
+        if req is None:
+            cache.clear()
+        else:
+            cache.pop(req, None)
+
+    def __getstate__(self):
+        # the cache is not pickled, weak references can't be
+        state = self.__dict__.copy()
+        state.pop('_claim_cache', None)
+        return state
+
+    def _claim_cache_get(self) -> 'weakref.WeakKeyDictionary[KData_PersistentVolume_Request, Tuple[Any, ...]]':
+        """
+        Returns the cache of :func:`claim_clears_storageclass` results by request, creating it on first use.
+        """
+        try:
+            return self._claim_cache
+        except AttributeError:
+            self._claim_cache = weakref.WeakKeyDictionary()
+            return self._claim_cache
+
+    def _claim_cache_signature(self, req: KData_PersistentVolume_Request) -> Tuple[Any, ...]:
+        """
+        Returns a snapshot of the values the build depends on, compared by equality, which is cheaper than
+        building again.
+
+        :raises TypeError: if the request doesn't have an attributes dict
+        """
+        configs = tuple(req.configs) if req.configs is not None else ()
+        return tuple(_claim_cache_snapshot(value) for value in itertools.chain(
+            (value for key, value in vars(self).items() if key != '_claim_cache'),
+            vars(req).values(),
+            configs,
+            itertools.chain.from_iterable(vars(config).values() for config in configs),
+        ))
+
+    def _claim_cache_store(self, req: KData_PersistentVolume_Request, pv: Mapping[Any, Any]) -> bool:
+        clears = self.claim_clears_storageclass(pv)
+        try:
+            self._claim_cache_get()[req] = self._claim_cache_signature(req) + (clears,)
+        except TypeError:
+            # request without attributes dict or weak references support
+            pass
+        return clears
+
+    def _claim_clears_storageclass(self, req: KData_PersistentVolume_Request) -> bool:
+        """
+        Returns :func:`claim_clears_storageclass` for the request, using the result cached by the last
+        :func:`build` of the request if it didn't change, so the PersistentVolume isn't built again.
+        """
+        try:
+            cached = self._claim_cache_get().get(req)
+            if cached is not None:
+                signature = self._claim_cache_signature(req)
+                if cached[:-1] == signature:
+                    return cached[-1]
+        except TypeError:
+            # request without attributes dict or weak references support
+            return self.claim_clears_storageclass(self.build(req))
+        return self._claim_cache_store(req, self.build(req))
 
     def build_claim(self, pvc: 'KData_PersistentVolumeClaim', req: 'KData_PersistentVolumeClaim_Request') -> Mapping[Any, Any]:
         return pvc.build(req)
@@ -197,7 +345,7 @@ class KData_PersistentVolume_EmptyDir(KData_PersistentVolume):
     A :class:`KData` that represents a Kubernetes PersistentVolume of type EmptyDir.
     """
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        return merger.merge(self.internal_build(req), {
+        return merger.merge(super().internal_build(req), {
             'spec': {
                 'emptyDir': {}
             },
@@ -223,9 +371,9 @@ class KData_PersistentVolume_HostPath(KData_PersistentVolume):
         if not isinstance(config, KData_PersistentVolume_HostPath.Config):
             raise InvalidParamError('Could not find configuration for PersistentVolume type hostPath')
 
-        ret = merger.merge(copy.deepcopy(super().internal_build(req)), {
+        ret = merger.merge(super().internal_build(req), {
             'spec': {
-                'hostPath': config.hostpath,
+                'hostPath': copy.deepcopy(config.hostpath),
             },
         })
         return ret
@@ -250,9 +398,9 @@ class KData_PersistentVolume_NFS(KData_PersistentVolume):
         if not isinstance(config, KData_PersistentVolume_NFS.Config):
             raise InvalidParamError('Could not find configuration for PersistentVolume type nfs')
 
-        ret = merger.merge(copy.deepcopy(super().internal_build(req)), {
+        ret = merger.merge(super().internal_build(req), {
             'spec': {
-                'nfs': config.nfs
+                'nfs': copy.deepcopy(config.nfs)
             },
         })
         return ret
@@ -284,9 +432,9 @@ class KData_PersistentVolume_CSI(KData_PersistentVolume):
         if not isinstance(config, KData_PersistentVolume_CSI.Config):
             raise InvalidParamError('Could not find configuration for PersistentVolume type CSI')
 
-        ret = merger.merge(copy.deepcopy(super().internal_build(req)), {
+        ret = merger.merge(super().internal_build(req), {
             'spec': {
-                'csi': config.csi
+                'csi': copy.deepcopy(config.csi)
             },
         })
 
@@ -295,13 +443,14 @@ class KData_PersistentVolume_CSI(KData_PersistentVolume):
 
         return ret
 
+    def claim_clears_storageclass(self, pv: Mapping[Any, Any]) -> bool:
+        return self.clear_storageclass_if_volumehandle and 'volumeHandle' in pv['spec']['csi'] and \
+            pv['spec']['csi']['volumeHandle'] != ''
+
     def build_claim(self, pvc: 'KData_PersistentVolumeClaim', req: 'KData_PersistentVolumeClaim_Request') -> Mapping[Any, Any]:
         ret = dict(super().build_claim(pvc, req))
-        if req.pvreq is not None:
-            pv = self.build(req.pvreq)
-            if self.clear_storageclass_if_volumehandle and 'volumeHandle' in pv['spec']['csi'] and \
-                    pv['spec']['csi']['volumeHandle'] != '':
-                ret['spec']['storageClassName'] = ''
+        if req.pvreq is not None and self._claim_clears_storageclass(req.pvreq):
+            ret['spec']['storageClassName'] = ''
         return ret
 
 
@@ -370,11 +519,11 @@ class KData_PersistentVolumeClaim(KData):
 
         if req.selector_labels is not None:
             ret['spec']['selector'] = {
-                'matchLabels': req.selector_labels,
+                'matchLabels': dict(req.selector_labels),
             }
         elif req.pvreq is not None and req.pvreq.selector_labels is not None:
             ret['spec']['selector'] = {
-                'matchLabels': req.pvreq.selector_labels,
+                'matchLabels': dict(req.pvreq.selector_labels),
             }
 
         if req.storage is not None:
@@ -391,9 +540,9 @@ class KData_PersistentVolumeClaim(KData):
             }
 
         if req.access_modes is not None:
-            ret['spec']['accessModes'] = req.access_modes
+            ret['spec']['accessModes'] = list(req.access_modes)
         elif req.pvreq is not None and req.pvreq.access_modes is not None:
-            ret['spec']['accessModes'] = req.pvreq.access_modes
+            ret['spec']['accessModes'] = list(req.pvreq.access_modes)
 
         if req.volume_name is not None:
             ret['spec']['volumeName'] = req.volume_name
@@ -401,7 +550,8 @@ class KData_PersistentVolumeClaim(KData):
         return ret
 
     def build(self, req: KData_PersistentVolumeClaim_Request) -> Mapping[Any, Any]:
-        return merger.merge(copy.deepcopy(self.internal_build(req)), req.merge_config if req.merge_config is not None else {})
+        return merger.merged(self.internal_build(req),
+                             copy.deepcopy(req.merge_config) if req.merge_config is not None else {})
 
 
 class KData_PersistentVolumeClaim_NoSelector(KData_PersistentVolumeClaim):
@@ -409,7 +559,7 @@ class KData_PersistentVolumeClaim_NoSelector(KData_PersistentVolumeClaim):
     A PersistentVolumeClaim that doesn't support selectors.
     """
     def internal_build(self, req: KData_PersistentVolumeClaim_Request) -> Mapping[Any, Any]:
-        ret: Dict[Any, Any] = dict(copy.deepcopy(super().internal_build(req)))
+        ret: Dict[Any, Any] = dict(super().internal_build(req))
         if 'selector' in ret['spec']:
             del ret['spec']['selector']
             if req.volume_name is not None:
@@ -1,7 +1,8 @@
+import functools
 from typing import Sequence, Any, Optional, Mapping, List, Dict
 
 from .configfile import ConfigFileRender, ConfigFile, ConfigFileRenderMulti
-from .data import Data, DisabledData
+from .data import Data, DISABLED_DATA, LazyData
 from .exception import InvalidParamError
 from .kdata import KData, KData_Value, KData_ConfigMap, KData_Secret, KData_Manual, KData_Env
 from .merger import merger
@@ -19,13 +20,17 @@ class KDataHelper_ConfigFile(KDataHelper):
     :param value: the value configured by the user, possible a :class:`ConfigFile`
     :param options: options to be used by the config file
     :param renderers: a list of config file renderers to be considered, in order
+    :param lazy: if True and value is a :class:`ConfigFile`, return a :class:`kubragen2.data.LazyData` that
+        renders it only if it is built
     :return: a configuration file content as string
     """
     @staticmethod
-    def info(value: Any, options: Options, renderers: Sequence[ConfigFileRender]) -> Any:
+    def info(value: Any, options: Options, renderers: Sequence[ConfigFileRender], lazy: bool = False) -> Any:
         if isinstance(value, str):
             return value
         if isinstance(value, ConfigFile):
+            if lazy:
+                return LazyData(functools.partial(KDataHelper_ConfigFile.info, value, options, renderers))
             configfilerender = ConfigFileRenderMulti(renderers)
             return configfilerender.render(value.get_value(options))
         if isinstance(value, Data):
@@ -48,12 +53,12 @@ class KDataHelper_Env(KDataHelper):
         :param base_value: the base dict that is merged with the result, normally containing the name of the object.
         :type base_value: Mapping
         :param value: a value configured by the user, possibly None
-        :param enabled: whether the information is enabled. If not, a :class:`kubragen.data.DisabledData` is returned
+        :param enabled: whether the information is enabled. If not, :data:`kubragen2.data.DISABLED_DATA` is returned
         :param disable_if_none: automatically disable if value and value_if_kdata is None
         :return: a configuration compatible with the Kubernetes *container.env* specification
         """
         if not enabled or (disable_if_none and value is None):
-            return DisabledData()
+            return DISABLED_DATA
 
         ret = base_value
         if ret is None:
@@ -127,12 +132,12 @@ class KDataHelper_Volume(KDataHelper):
         :param base_value: the base dict that is merged with the result, normally containing the name of the object.
         :type base_value: dict
         :param value: a value configured by the user, possibly None
-        :param enabled: whether the information is enabled. If not, a :class:`kubragen.data.DisabledData` is returned
+        :param enabled: whether the information is enabled. If not, :data:`kubragen2.data.DISABLED_DATA` is returned
         :param disable_if_none: automatically disable if value and value_if_kdata is None
         :return: a configuration compatible with the Kubernetes *podSpec.volume* specification
         """
         if not enabled or (disable_if_none and value is None):
-            return DisabledData()
+            return DISABLED_DATA
 
         ret = base_value
         if ret is None:
@@ -1,22 +1,10 @@
-import deepmerge  # type: ignore
+from .private.merger import Merger
 
-from .private.merger import option_check_key_exist, option_merge_fallback, option_type_conflict
-
-merger_nocreate = deepmerge.Merger(
-    [
-        (list, "append"),
-        (dict, [option_check_key_exist, "merge"]),
-    ],
-    ['override', option_merge_fallback], [option_type_conflict]
-)
-"""A dict/list merger that doesn't allow dict key creation, based on the :mod:`deepmerge` module."""
+merger_nocreate = Merger(create_keys=False)
+"""A dict/list merger that doesn't allow dict key creation, with the same semantics as the :mod:`deepmerge`
+module merger using the "append" list strategy and the "merge" dict strategy."""
 
 # A merger that allows key creation
-merger = deepmerge.Merger(
-    [
-        (list, "append"),
-        (dict, "merge"),
-    ],
-    ['override', option_merge_fallback], [option_type_conflict]
-)
-"""A dict/list merger, based on the :mod:`deepmerge` module."""
+merger = Merger()
+"""A dict/list merger, with the same semantics as the :mod:`deepmerge` module merger using the "append" list
+strategy and the "merge" dict strategy."""
@@ -1,11 +1,16 @@
-from typing import Optional, Any
+from typing import Optional, Any, Callable
+
+from .data import Data
+from .exception import InvalidOperationError
 
 
 class Option:
-    pass
+    __slots__ = ()
 
 
 class OptionValue(Option):
+    __slots__ = ('name', 'wrap_type')
+
     name: str
     wrap_type: Optional[Any]
 
@@ -13,7 +18,75 @@ class OptionValue(Option):
         self.name = name
         self.wrap_type = wrap_type
 
+    def __reduce_ex__(self, protocol):
+        if type(self) is not OptionValue:
+            return super().__reduce_ex__(protocol)
+        if self.wrap_type is None:
+            return OptionValue, (self.name,)
+        return OptionValue, (self.name, self.wrap_type)
+
     def process_value(self, value: Any) -> Any:
         if self.wrap_type is not None:
             return self.wrap_type(value)
         return value
+
+
+class OptionData(Data):
+    """
+    A :class:`Data` whose enablement and value are taken from options, to replace
+    ``ValueData(value, enabled=options.option_get('component.enabled'))`` in templates.
+
+    It can only be built by :class:`kubragen2.options.OptionsDataBuilder`, which looks up each distinct
+    option name only once per build.
+
+    :param value: the value, used if *value_option* is None
+    :param enabled_option: dotted name of the option that controls enablement, or None to always enable
+    :param enabled_test: predicate applied to the *enabled_option* value, defaults to :func:`bool`
+    :param value_option: dotted name of the option to use as value
+    :param value_func: function applied to the *value_option* value
+    """
+    __slots__ = ('value', 'enabled_option', 'enabled_test', 'value_option', 'value_func')
+
+    value: Any
+    enabled_option: Optional[str]
+    enabled_test: Callable[[Any], bool]
+    value_option: Optional[str]
+    value_func: Optional[Callable[[Any], Any]]
+
+    def __init__(self, value: Any = None, enabled_option: Optional[str] = None,
+                 enabled_test: Callable[[Any], bool] = bool, value_option: Optional[str] = None,
+                 value_func: Optional[Callable[[Any], Any]] = None):
+        self.value = value
+        self.enabled_option = enabled_option
+        self.enabled_test = enabled_test
+        self.value_option = value_option
+        self.value_func = value_func
+
+    def is_enabled(self) -> bool:
+        raise InvalidOperationError('OptionData must be built using OptionsDataBuilder')
+
+    def get_value(self) -> Any:
+        raise InvalidOperationError('OptionData must be built using OptionsDataBuilder')
+
+    def resolve_enabled(self, option_get: Callable[[str], Any]) -> bool:
+        """
+        Whether the data is enabled.
+
+        :param option_get: function that returns the value of a dotted-name option
+        """
+        if self.enabled_option is None:
+            return True
+        return bool(self.enabled_test(option_get(self.enabled_option)))
+
+    def resolve_value(self, option_get: Callable[[str], Any]) -> Any:
+        """
+        Returns the value of the data.
+
+        :param option_get: function that returns the value of a dotted-name option
+        """
+        if self.value_option is None:
+            return self.value
+        value = option_get(self.value_option)
+        if self.value_func is not None:
+            return self.value_func(value)
+        return value
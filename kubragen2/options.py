@@ -1,39 +1,165 @@
-from typing import Mapping, Any, Optional, Sequence, Union, MutableMapping, MutableSequence
+import concurrent.futures
+import copy
+import hashlib
+import pickle
+import types
+from typing import Mapping, MutableMapping, MutableSequence, Any, Optional, Sequence, List, Iterable, Iterator, \
+    Dict, Tuple
 
-from .build import DataBuilder
-from .exception import InvalidParamError
-from .option import OptionValue, Option
-from .private.merger import option_merge_fallback, option_type_conflict
-from .private.optionsmerger import OptionsMerger
+from .build import DataBuilder, BuildDataBatch, IterBuildData, BuildPlan, BuildObserver, BuildStats, \
+    AsyncBuildData, BUILD_REMOVE
+from .data import Data
+from .exception import InvalidParamError, InvalidOperationError
+from .option import OptionValue, Option, OptionData
+from .private.merger import Merger, kway_contributors, kway_merge
 from .util import dict_get_value, dict_has_name
 
 
+_NOT_FOUND = object()
+_MISSING = object()
+
+
 class Options:
     """
     Helper used to extract options from a list of merged Mapping.
     Uses dotted property format for easy access.
 
+    Lookups use an index of the dotted names, built on first use, and the :class:`OptionValue` references are
+    resolved only once. These caches are discarded when :attr:`options` is set. Each index entry remembers the
+    Mappings in its path, which are checked on each lookup, so the index is also rebuilt if the options
+    Mapping is changed in place.
+
     :param options: list of Mapping to merge in order.
     """
-    options: Mapping[Any, Any]
+    _options: Mapping[Any, Any]
+    _index: Optional[Dict[str, Any]]
+    _resolved: Dict[str, Any]
 
     def __init__(self, *options: Optional[Mapping[Any, Any]]):
-        self.options = {}
-        for option in options:
-            if option is not None:
-                self.options = optionsmerger.merge(self.options, option)
+        self.options = optionsmerger.merge_all([{}] + [option for option in options if option is not None])
+
+    @property
+    def options(self) -> Mapping[Any, Any]:
+        """The merged options."""
+        return self._options
+
+    @options.setter
+    def options(self, value: Mapping[Any, Any]) -> None:
+        self._options = value
+        self.invalidate_cache()
+
+    def freeze(self) -> 'FrozenOptions':
+        """
+        Returns an immutable snapshot of the current options.
+
+        :return: the snapshot
+        """
+        return FrozenOptions(self.options)
+
+    def invalidate_cache(self) -> None:
+        """
+        Discards the lookup index and the resolved references.
+        """
+        self._index = None
+        self._resolved = {}
+
+    def __getstate__(self):
+        # the caches are rebuilt on first use
+        state = self.__dict__.copy()
+        state.pop('_index', None)
+        state.pop('_resolved', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.invalidate_cache()
+
+    def _build_index(self) -> Dict[str, Any]:
+        """
+        Builds the index of all values reachable by a dotted name through nested Mappings.
+        Keys that are not strings or contain a dot can't be reached by a dotted name, and are not indexed.
+
+        Each entry is a tuple of the value, the Mapping that contains it, its key, and the dotted name of the
+        Mapping, or None for the root.
+        """
+        index: Dict[str, Any] = {}
+        stack: List[Tuple[Optional[str], Mapping[Any, Any]]] = [(None, self._options)]
+        while stack:
+            parent, data = stack.pop()
+            prefix = parent + '.' if parent is not None else ''
+            for key, value in data.items():
+                if type(key) is not str or '.' in key:
+                    continue
+                name = prefix + key
+                index[name] = (value, data, key, parent)
+                if isinstance(value, Mapping):
+                    stack.append((name, value))
+        return index
+
+    def _lookup(self, name: str) -> Any:
+        """
+        Returns the unprocessed dotted-name option value from the index, :data:`_MISSING` if the option is
+        known not to exist, or :data:`_NOT_FOUND` if not indexed.
+        Names not in the index must be checked with :func:`dict_has_name` / :func:`dict_get_value`, which
+        handle the non-Mapping intermediate values.
+        """
+        index = self._index
+        if index is None:
+            index = self._index = self._build_index()
+        entry = index.get(name)
+        if entry is None:
+            return _NOT_FOUND
+        if not _index_entry_current(index, entry):
+            # the options were changed in place
+            self.invalidate_cache()
+            return self._lookup(name)
+        return entry[0]
+
+    def _resolved_current(self, name: str) -> bool:
+        """
+        Whether the memoized resolution of the dotted-name option is still current, checking that the options
+        in its reference chain were not changed in place.
+        """
+        index = self._index
+        while index is not None:
+            entry = index.get(name)
+            if entry is None or not _index_entry_current(index, entry):
+                return False
+            if not isinstance(entry[0], OptionValue):
+                return True
+            name = entry[0].name
+        return False
+
+    def _lookup_value(self, name: str) -> Any:
+        """
+        Returns the unprocessed dotted-name option value.
+
+        :raises InvalidParamError: if the option does not exist
+        """
+        value = self._lookup(name)
+        if value is _NOT_FOUND:
+            return dict_get_value(self.options, name)
+        if value is _MISSING:
+            raise InvalidParamError('Could not find item "{}"'.format(name))
+        return value
 
     def has_option(self, name: str) -> Any:
         """
         Checks if the dotted-name option exists.
         """
-        return dict_has_name(self.options, name)
+        value = self._lookup(name)
+        if value is _NOT_FOUND:
+            return dict_has_name(self.options, name)
+        return value is not _MISSING
 
     def option_get(self, name: str) -> Any:
         """
         Gets the dotted-name option value.
         """
-        return self._option_process(dict_get_value(self.options, name))
+        value = self._lookup_value(name)
+        if isinstance(value, Option):
+            return self._option_process(value, [name])
+        return value
 
     def option_get_opt(self, name: str, default_value: Any) -> Any:
         """
@@ -46,56 +172,443 @@ class Options:
         Gets the dotted-name option value, using a default, and allowing customizing the values that
         are considered empty.
         """
-        if not self.has_option(name):
+        value = self._lookup(name)
+        if value is _MISSING:
             return default_value
-        value = self.option_get(name)
+        if value is _NOT_FOUND:
+            if not dict_has_name(self.options, name):
+                return default_value
+            value = dict_get_value(self.options, name)
+        if isinstance(value, Option):
+            value = self._option_process(value, [name])
         if value in empty_values:
             return default_value
         return value
 
-    def _option_process(self, value: Any) -> Any:
+    def option_get_opt_many(self, defaults: Mapping[str, Any], prefix: Optional[str] = None,
+                            empty_values: Sequence[Any] = (None, '')) -> Dict[str, Any]:
+        """
+        Gets many dotted-name option values at once, with the same result as calling
+        :func:`option_get_opt_custom` for each one. If a prefix is set, it is looked up only once.
+
+        :param defaults: Mapping of the dotted names to their default values
+        :param prefix: dotted-name prefix of all the names, without the trailing dot
+        :param empty_values: the values that are considered empty
+        :return: a dict of the dotted names (without the prefix) to their values
+        """
+        if prefix is None:
+            return {name: self.option_get_opt_custom(name, default_value, empty_values)
+                    for name, default_value in defaults.items()}
+        node = self._lookup(prefix)
+        if node is _MISSING:
+            return dict(defaults)
+        if node is _NOT_FOUND or not isinstance(node, Mapping):
+            return {name: self.option_get_opt_custom('{}.{}'.format(prefix, name), default_value, empty_values)
+                    for name, default_value in defaults.items()}
+        ret: Dict[str, Any] = {}
+        for name, default_value in defaults.items():
+            if '.' not in name:
+                if name not in node:
+                    ret[name] = default_value
+                    continue
+                value = node[name]
+            else:
+                if not dict_has_name(node, name):
+                    ret[name] = default_value
+                    continue
+                value = dict_get_value(node, name)
+            if isinstance(value, Option):
+                value = self._option_process(value, ['{}.{}'.format(prefix, name)])
+            ret[name] = default_value if value in empty_values else value
+        return ret
+
+    def _option_process(self, value: Any, chain: Optional[List[str]] = None) -> Any:
         """
         Process custom :class:`Option` types.
+
+        :param value: the value to process
+        :param chain: the option names being resolved, to detect cyclic references
         """
         if isinstance(value, Option):
             if isinstance(value, OptionValue):
-                return value.process_value(self.option_get(value.name))
+                return value.process_value(self._option_resolve(value.name, chain if chain is not None else []))
             else:
                 raise InvalidParamError('Unknown Optiona type: "{}"'.format(repr(value)))
         return value
 
+    def _option_resolve(self, name: str, chain: List[str]) -> Any:
+        """
+        Resolves an :class:`OptionValue` reference to the dotted-name option, memoizing the result.
+
+        :raises InvalidParamError: if the reference is cyclic
+        """
+        try:
+            value = self._resolved[name]
+        except KeyError:
+            pass
+        else:
+            if self._resolved_current(name):
+                return value
+        if name in chain:
+            raise InvalidParamError('Cyclic option reference: "{}"'.format(' -> '.join(chain + [name])))
+        value = self._lookup_value(name)
+        if isinstance(value, Option):
+            value = self._option_process(value, chain + [name])
+        self._resolved[name] = value
+        return value
+
+
+class LayeredOptions(Options):
+    """
+    :class:`Options` that keeps the option Mappings as a stack of layers instead of merging them, and resolves
+    each lookup through the layers with the same result as the merge, like a deep
+    :class:`collections.ChainMap`. The merged :attr:`options` Mapping is only built if it is accessed.
+
+    Use :func:`derive` to create variants with additional layers, without copying the existing ones.
+    The layers are shared with the derived instances, and are never changed. If they are changed in place,
+    :func:`invalidate_cache` must be called.
+
+    :param options: list of Mapping, in order of increasing priority
+    """
+    _layers: Tuple[Mapping[Any, Any], ...]
+    _merged: Optional[Mapping[Any, Any]]
+    _cache: Dict[str, Any]
+
+    def __init__(self, *options: Optional[Mapping[Any, Any]]):
+        self._layers = tuple(option for option in options if option is not None)
+        self.invalidate_cache()
+
+    @property
+    def options(self) -> Mapping[Any, Any]:
+        """The merged options, built on first access. Setting it replaces all the layers."""
+        if self._merged is None:
+            self._merged = kway_merge(self._top_down())
+        return self._merged
+
+    @options.setter
+    def options(self, value: Mapping[Any, Any]) -> None:
+        self._layers = (value,)
+        self.invalidate_cache()
+
+    @property
+    def layers(self) -> Tuple[Mapping[Any, Any], ...]:
+        """The option layers, in order of increasing priority."""
+        return self._layers
+
+    def derive(self, overrides: Optional[Mapping[Any, Any]]) -> 'LayeredOptions':
+        """
+        Creates a new instance with an additional top layer. The current layers are shared, not copied.
+
+        :param overrides: the options to add over the current ones
+        :return: the new instance
+        """
+        return LayeredOptions(*self._layers, overrides)
+
+    def invalidate_cache(self) -> None:
+        super().invalidate_cache()
+        self._merged = None
+        self._cache = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_merged', None)
+        state.pop('_cache', None)
+        return state
+
+    def _resolved_current(self, name: str) -> bool:
+        # the layers are never changed
+        return True
+
+    def _top_down(self) -> List[Any]:
+        # the layers are merged over an empty dict, like in Options
+        return list(reversed(self._layers)) + [{}]
+
+    def _lookup(self, name: str) -> Any:
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        values = self._top_down()
+        for chunk in name.split('.'):
+            values = kway_contributors(values)
+            if not isinstance(values[0], Mapping):
+                # non-Mapping intermediate values are checked in the merged options
+                return _NOT_FOUND
+            values = [value[chunk] for value in values if chunk in value]
+            if not values:
+                self._cache[name] = _MISSING
+                return _MISSING
+        value = self._cache[name] = kway_merge(values)
+        return value
+
+
+class FrozenOptions(Options):
+    """
+    An immutable snapshot of options, usually created by :func:`Options.freeze`.
+
+    It keeps a private copy of the merged options, and the Mappings and Sequences it returns are copies, so it
+    can be shared between threads. :attr:`fingerprint` is a stable hash of the contents that can be used as a
+    cache key, and snapshots with the same fingerprint compare equal.
+
+    :param options: list of Mapping to merge in order
+    """
+    _fingerprint: Optional[str]
+
+    def __init__(self, *options: Optional[Mapping[Any, Any]]):
+        self._freeze(Options(*copy.deepcopy(options)).options)
+
+    def _freeze(self, options: Mapping[Any, Any]) -> None:
+        self._options = options
+        super().invalidate_cache()
+        self._index = self._build_index()
+        self._fingerprint = None
+
+    @property
+    def options(self) -> Mapping[Any, Any]:
+        """A read-only view of the options. The nested Mappings and Sequences must not be changed."""
+        return types.MappingProxyType(self._options)
+
+    @options.setter
+    def options(self, value: Mapping[Any, Any]) -> None:
+        raise InvalidOperationError('FrozenOptions cannot be changed')
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        The SHA-256 hex digest of a canonical serialization of the options, including the :class:`OptionValue`
+        instances. Values of other types are serialized with :mod:`pickle`, so the fingerprint is only stable
+        if their pickled state is deterministic, for example objects holding sets of strings can have a different
+        fingerprint in each process.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            _fingerprint_update(digest, self._options)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def freeze(self) -> 'FrozenOptions':
+        return self
+
+    def invalidate_cache(self) -> None:
+        # the options can't change
+        pass
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._freeze(self._options)
+
+    def _resolved_current(self, name: str) -> bool:
+        # the options can't change
+        return True
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenOptions):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def option_get(self, name: str) -> Any:
+        return _frozen_copy(super().option_get(name))
+
+    def option_get_opt_custom(self, name: str, default_value: Any, empty_values: Sequence[Any]) -> Any:
+        return _frozen_copy(super().option_get_opt_custom(name, default_value, empty_values))
+
+    def option_get_opt_many(self, defaults: Mapping[str, Any], prefix: Optional[str] = None,
+                            empty_values: Sequence[Any] = (None, '')) -> Dict[str, Any]:
+        return {name: _frozen_copy(value) for name, value in
+                super().option_get_opt_many(defaults, prefix=prefix, empty_values=empty_values).items()}
+
+    def _option_process(self, value: Any, chain: Optional[List[str]] = None) -> Any:
+        return _frozen_copy(super()._option_process(value, chain))
+
+
+def _index_entry_current(index: Dict[str, Any], entry: Tuple[Any, Mapping[Any, Any], str, Optional[str]]) -> bool:
+    """
+    Whether an entry of the :class:`Options` index still matches the options, checking each Mapping in its
+    path by identity.
+    """
+    while True:
+        value, container, key, parent = entry
+        if container.get(key, _NOT_FOUND) is not value:
+            return False
+        if parent is None:
+            return True
+        entry = index[parent]
+
+
+def _frozen_copy(value: Any) -> Any:
+    if isinstance(value, (MutableMapping, MutableSequence)):
+        return copy.deepcopy(value)
+    return value
+
+
+def _fingerprint_bytes(value: Any) -> bytes:
+    digest = hashlib.sha256()
+    _fingerprint_update(digest, value)
+    return digest.digest()
+
+
+def _fingerprint_update(digest: Any, value: Any) -> None:
+    """
+    Adds a canonical serialization of the value to the digest. Mapping items are sorted by the digest of
+    their keys and set items by their own digest, so the result doesn't depend on their order.
+
+    Values of other types are serialized with :mod:`pickle`, which is only canonical if their pickled state is.
+    It is not, for example, for objects holding sets of strings, whose order changes between processes.
+    """
+    if value is None:
+        digest.update(b'n')
+    elif isinstance(value, bool):
+        digest.update(b't' if value else b'f')
+    elif isinstance(value, int):
+        digest.update(b'i%d;' % value)
+    elif isinstance(value, float):
+        digest.update(b'r' + repr(value).encode('ascii') + b';')
+    elif isinstance(value, str):
+        encoded = value.encode('utf-8')
+        digest.update(b's%d:' % len(encoded) + encoded)
+    elif isinstance(value, bytes):
+        digest.update(b'b%d:' % len(value) + value)
+    elif isinstance(value, Mapping):
+        digest.update(b'd%d:' % len(value))
+        for key, item in sorted(((_fingerprint_bytes(k), v) for k, v in value.items()), key=lambda i: i[0]):
+            digest.update(key)
+            _fingerprint_update(digest, item)
+    elif isinstance(value, (list, tuple)):
+        digest.update((b'l%d:' if isinstance(value, list) else b'u%d:') % len(value))
+        for item in value:
+            _fingerprint_update(digest, item)
+    elif isinstance(value, (set, frozenset)):
+        # sets and frozensets compare equal, so they share the tag
+        digest.update(b'e%d:' % len(value))
+        for item in sorted(_fingerprint_bytes(v) for v in value):
+            digest.update(item)
+    elif type(value) is OptionValue:
+        digest.update(b'o')
+        _fingerprint_update(digest, value.name)
+        wrap_type = value.wrap_type
+        _fingerprint_update(digest, None if wrap_type is None else '{}.{}'.format(
+            getattr(wrap_type, '__module__', ''), getattr(wrap_type, '__qualname__', repr(wrap_type))))
+    else:
+        try:
+            encoded = pickle.dumps(value, protocol=4)
+        except Exception as e:
+            raise InvalidParamError('Cannot fingerprint option value: "{}"'.format(repr(value))) from e
+        digest.update(b'p%d:' % len(encoded) + encoded)
+
 
 class OptionsDataBuilder(DataBuilder):
     """
-    A :class:`DataBuilder` that takes in account :class:`Option` instances.
+    A :class:`DataBuilder` that takes in account :class:`Option` and :class:`OptionData` instances.
+
+    The options used by :class:`OptionData` instances are looked up only once per build, they must not change
+    during the build.
+
+    :param options: the options used to resolve the :class:`Option` instances
+    :param prune: whether to remove the empty Mappings and Sequences and the None values left after building
+    :param prune_keep: list of :mod:`fnmatch` patterns of dotted paths that are never pruned
+    :param observer: an observer that receives the statistics of each build
     """
     options: Options
 
-    def __init__(self, options: Options):
-        super().__init__()
+    def __init__(self, options: Options, prune: bool = False, prune_keep: Optional[Sequence[str]] = None,
+                 observer: Optional[BuildObserver] = None):
+        super().__init__(prune=prune, prune_keep=prune_keep, observer=observer)
         self.options = options
+        self._option_cache: Dict[str, Any] = {}
+
+    def build(self, data: Any, in_place: bool = True) -> Any:
+        self._option_cache = {}
+        return super().build(data, in_place=in_place)
+
+    def build_item(self, value: Any) -> Any:
+        if isinstance(value, OptionData):
+            return self._build_option_data(value, None)
+        return self._build_option(super().build_item(value), None)
+
+    def build_item_observed(self, value: Any, stats: BuildStats) -> Any:
+        if isinstance(value, Data):
+            stats.data_resolved += 1
+            if isinstance(value, OptionData):
+                return self._build_option_data(value, stats)
+        return self._build_option(super().build_item(value), stats)
+
+    def _build_option(self, value: Any, stats: Optional[BuildStats]) -> Any:
+        if isinstance(value, Option):
+            if stats is not None:
+                stats.option_lookups += 1
+            return self.options._option_process(value)
+        return value
+
+    def _build_option_data(self, value: OptionData, stats: Optional[BuildStats]) -> Any:
+        def option_get(name: str) -> Any:
+            try:
+                return self._option_cache[name]
+            except KeyError:
+                pass
+            if stats is not None:
+                stats.option_lookups += 1
+            ret = self._option_cache[name] = self.options.option_get(name)
+            return ret
 
-    def build_prop(self, data: Union[MutableMapping, MutableSequence], key: Any) -> None:
-        super().build_prop(data, key)
-        if key in data and isinstance(data[key], Option):
-            data[key] = self.options._option_process(data[key])
+        if not value.resolve_enabled(option_get):
+            return BUILD_REMOVE
+        return self._build_option(value.resolve_value(option_get), stats)
 
     def get_value(self, data: Any) -> Any:
+        if isinstance(data, OptionData):
+            if not data.resolve_enabled(self.options.option_get):
+                return None
+            return self.get_value(data.resolve_value(self.options.option_get))
         return self.options._option_process(super().get_value(data))
 
 
-def OptionsBuildData(options: Options, data: Any, in_place: bool = True) -> Any:
+def OptionsBuildData(options: Options, data: Any, in_place: bool = True, prune: bool = False,
+                     prune_keep: Optional[Sequence[str]] = None, observer: Optional[BuildObserver] = None) -> Any:
     """
     Build data taking in account :class:`Option` instances.
+    See :func:`kubragen2.build.BuildData` for the parameters.
+    """
+    return OptionsDataBuilder(options, prune=prune, prune_keep=prune_keep, observer=observer).build(
+        data, in_place=in_place)
+
+
+async def OptionsAsyncBuildData(options: Options, data: Any, in_place: bool = True, concurrency: int = 10) -> Any:
+    """
+    Build data taking in account :class:`Option` instances, resolving the :class:`kubragen2.data.AsyncData`
+    instances concurrently. See :func:`kubragen2.build.AsyncBuildData`.
+    """
+    return await AsyncBuildData(data, in_place=in_place, builder=OptionsDataBuilder(options), concurrency=concurrency)
+
+
+def OptionsBuildDataPlan(options: Options, plan: BuildPlan) -> Any:
+    """
+    Build a compiled template taking in account :class:`Option` instances.
+    See :class:`kubragen2.build.BuildPlan`.
+    """
+    return plan.build(OptionsDataBuilder(options))
+
+
+def OptionsIterBuildData(options: Options, data: Iterable[Any], in_place: bool = True) -> Iterator[Any]:
+    """
+    Build an iterable of documents taking in account :class:`Option` instances, yielding each one as soon as
+    it is built. See :func:`kubragen2.build.IterBuildData`.
+    """
+    return IterBuildData(data, in_place=in_place, builder=OptionsDataBuilder(options))
+
+
+def OptionsBuildDataBatch(options: Options, data: Sequence[Any], in_place: bool = True,
+                          executor: Optional[concurrent.futures.Executor] = None, max_workers: Optional[int] = None,
+                          use_processes: bool = True, serial_threshold: int = 16) -> List[Any]:
+    """
+    Build a sequence of documents in parallel taking in account :class:`Option` instances.
+    See :func:`kubragen2.build.BuildDataBatch` for the parameters.
     """
-    return OptionsDataBuilder(options).build(data, in_place=in_place)
+    return BuildDataBatch(data, in_place=in_place, builder=OptionsDataBuilder(options), executor=executor,
+                          max_workers=max_workers, use_processes=use_processes, serial_threshold=serial_threshold)
 
 
-optionsmerger = OptionsMerger(
-    [
-        (list, "append"),
-        (dict, "merge"),
-    ],
-    ['override', option_merge_fallback], ['override', option_type_conflict]
-)
+optionsmerger = Merger(type_conflict_override=True, option_override=True)
 """A dict/list merger that supports options."""
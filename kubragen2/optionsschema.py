@@ -0,0 +1,200 @@
+from typing import Any, Mapping, Optional, Sequence, Tuple, Union, List, Dict, Set
+
+from .data import BaseData
+from .exception import OptionsSchemaError
+from .option import Option
+from .options import Options
+
+
+_NO_TYPES: Tuple[type, ...] = ()
+
+
+class SchemaValue:
+    """
+    An option value in an :class:`OptionsSchema`.
+
+    :param types: the allowed type or tuple of types, or None to allow any type
+    :param default: the default value
+    :param required: whether the option must be set to a value that is not None
+    """
+    __slots__ = ('types', 'default', 'required')
+
+    types: Optional[Tuple[type, ...]]
+    default: Any
+    required: bool
+
+    def __init__(self, types: Union[type, Tuple[type, ...], None] = None, default: Any = None,
+                 required: bool = False):
+        self.types = (types,) if isinstance(types, type) else types
+        self.default = default
+        self.required = required
+
+
+class _SchemaNode:
+    """
+    A compiled schema item. *children* is set for Mappings, and *types* for values.
+    If *inferred* is True, the types come from the default value, and the values are allowed if they
+    are compatible with it, like in :data:`kubragen2.merger.merger_nocreate`.
+    """
+    __slots__ = ('name', 'children', 'types', 'default', 'required', 'inferred')
+
+    name: str
+    children: Optional[Dict[Any, '_SchemaNode']]
+    types: Optional[Tuple[type, ...]]
+    default: Any
+    required: bool
+    inferred: bool
+
+    def __init__(self, name: str, children: Optional[Dict[Any, '_SchemaNode']] = None,
+                 types: Optional[Tuple[type, ...]] = None, default: Any = None, required: bool = False,
+                 inferred: bool = False):
+        self.name = name
+        self.children = children
+        self.types = types
+        self.default = default
+        self.required = required
+        self.inferred = inferred
+
+
+class OptionsSchema:
+    """
+    Validates option Mappings and applies default values, reporting all the errors at once.
+
+    The schema is a nested Mapping, like the default options usually merged with
+    :data:`kubragen2.merger.merger_nocreate`. A dict defines a Mapping option, which doesn't allow
+    keys that are not in the schema. Any other value is the default value of an option, which only
+    allows values of a compatible type, except if it is None.
+    Use :class:`SchemaValue` to set the allowed types, or to mark an option as required. A Mapping option
+    that allows any key can be set using ``SchemaValue(dict)``.
+
+    :class:`kubragen2.option.Option` and :class:`kubragen2.data.BaseData` values are allowed for any
+    option, and None for any option that is not a Mapping.
+
+    The schema is compiled once, on creation.
+
+    :param schema: the options schema
+    """
+    _root: _SchemaNode
+    _required: List[_SchemaNode]
+
+    def __init__(self, schema: Mapping[Any, Any]):
+        self._required = []
+        self._root = self._compile('', schema)
+
+    def _compile(self, name: str, schema: Any) -> _SchemaNode:
+        if isinstance(schema, dict):
+            return _SchemaNode(name, children={
+                key: self._compile('{}.{}'.format(name, key) if name else str(key), value)
+                for key, value in schema.items()
+            })
+        if isinstance(schema, SchemaValue):
+            node = _SchemaNode(name, types=schema.types if schema.types is not None else _NO_TYPES,
+                               default=schema.default, required=schema.required)
+            if node.required:
+                self._required.append(node)
+            return node
+        return _SchemaNode(name, types=_NO_TYPES if schema is None else (type(schema),), default=schema,
+                           inferred=True)
+
+    def defaults(self) -> Dict[Any, Any]:
+        """
+        Returns a new Mapping with the default values of all the options.
+        """
+        return _node_defaults(self._root)
+
+    def validate(self, *options: Optional[Mapping[Any, Any]]) -> List[str]:
+        """
+        Validates the option Mappings.
+
+        :param options: list of Mapping, as would be passed to :class:`kubragen2.options.Options`
+        :return: the list of error messages, empty if the options are valid
+        """
+        errors: List[str] = []
+        found: Set[int] = set()
+        for option in options:
+            if option is not None:
+                _node_validate(self._root, option, errors, found)
+        for node in self._required:
+            if id(node) not in found:
+                errors.append('Missing required option: "{}"'.format(node.name))
+        return errors
+
+    def check(self, *options: Optional[Mapping[Any, Any]]) -> None:
+        """
+        Validates the option Mappings.
+
+        :param options: list of Mapping, as would be passed to :class:`kubragen2.options.Options`
+        :raises OptionsSchemaError: if the options are not valid, with the list of all the errors
+        """
+        errors = self.validate(*options)
+        if errors:
+            raise OptionsSchemaError(errors)
+
+    def build_options(self, *options: Optional[Mapping[Any, Any]]) -> Options:
+        """
+        Validates the option Mappings, and returns a :class:`kubragen2.options.Options` with them merged over
+        the default values.
+
+        :param options: list of Mapping to merge in order
+        :return: the options
+        :raises OptionsSchemaError: if the options are not valid, with the list of all the errors
+        """
+        self.check(*options)
+        return Options(self.defaults(), *options)
+
+
+def _node_defaults(node: _SchemaNode) -> Any:
+    if node.children is not None:
+        return {key: _node_defaults(child) for key, child in node.children.items()}
+    default = node.default
+    # the default values can't be shared, the merge changes the containers
+    return _copy_containers(default)
+
+
+def _copy_containers(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy_containers(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_containers(item) for item in value]
+    return value
+
+
+def _type_names(types: Sequence[type]) -> str:
+    return ' or '.join(t.__name__ for t in types)
+
+
+def _node_validate(node: _SchemaNode, value: Any, errors: List[str], found: Set[int]) -> None:
+    stack = [(node, value)]
+    while stack:
+        node, value = stack.pop()
+        if isinstance(value, (Option, BaseData)):
+            if node.required:
+                found.add(id(node))
+            continue
+        if node.children is not None:
+            if not isinstance(value, Mapping):
+                errors.append('Invalid type for {}: expected Mapping, got {}'.format(
+                    'option "{}"'.format(node.name) if node.name else 'options', type(value).__name__))
+                continue
+            children = node.children
+            items = []
+            for key, item in value.items():
+                child = children.get(key)
+                if child is None:
+                    errors.append('Unknown option: "{}"'.format('{}.{}'.format(node.name, key) if node.name
+                                                                 else key))
+                else:
+                    items.append((child, item))
+            items.reverse()
+            stack.extend(items)
+            continue
+        if value is None:
+            continue
+        types = node.types
+        if types and not isinstance(value, types) and \
+                not (node.inferred and isinstance(node.default, type(value))):
+            errors.append('Invalid type for option "{}": expected {}, got {}'.format(
+                node.name, _type_names(types), type(value).__name__))
+            continue
+        if node.required:
+            found.add(id(node))
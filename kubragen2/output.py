@@ -1,8 +1,9 @@
 import os
 import stat
 import string
+import sys
 import uuid
-from typing import Any, Dict, Optional, List, Mapping, Sequence
+from typing import Any, Dict, Optional, List, Mapping, Sequence, Iterable, Iterator
 
 import yaml
 
@@ -24,6 +25,16 @@ class OD_FileTemplate(OutputData):
     pass
 
 
+class OutputDataStream:
+    """
+    Wraps an iterable of data added by :func:`OutputFile.extend`. It is consumed only when the file is output.
+    """
+    data: Iterable[Any]
+
+    def __init__(self, data: Iterable[Any]):
+        self.data = data
+
+
 class OutputDataDumper:
     """Base class to data dumper to string."""
     def dump(self, data) -> str:
@@ -81,6 +92,41 @@ class OutputFile:
         else:
             self.data.append(data)
 
+    def extend(self, data: Iterable[Any]) -> None:
+        """
+        Append an iterable of data to the file, for example from :func:`kubragen2.build.IterBuildData`.
+
+        The iterable is only consumed when the file is output, one item at a time, so the items don't need to be
+        all in memory at once. Because of that, the file can only be output once. :class:`OutputProject` passes
+        the output to :func:`OutputDriver.write_file_chunks` as it is generated, so drivers that write the chunks
+        directly, like :class:`OutputDriver_Directory`, also don't keep the whole output in memory.
+        If *reverse* is True, the iterable is consumed immediately.
+
+        :param data: iterable of strings or relevant classes
+        """
+        if self.reverse:
+            for d in data:
+                self.append(d)
+        else:
+            self.data.append(OutputDataStream(data))
+
+    def iter_data(self) -> Iterator[Any]:
+        """
+        Iterates the file data, consuming the iterables added by :func:`extend`.
+        """
+        for d in self.data:
+            if isinstance(d, OutputDataStream):
+                yield from d.data
+            else:
+                yield d
+
+    def __getstate__(self):
+        # the iterables added by extend are consumed when pickling
+        state = self.__dict__.copy()
+        state['data'] = list(self.iter_data())
+        self.data = state['data']
+        return state
+
     def output_filename(self, seq: Optional[int] = None) -> str:
         """
         Returns the filename that should be output.
@@ -107,18 +153,33 @@ class OutputFile:
         """Whether the file should be marked as executable."""
         return False
 
-    def to_string(self, dumper: OutputDataDumper):
+    def to_string(self, dumper: OutputDataDumper) -> str:
         """
         Output file to string using the dumper.
 
         :param dumper: dumper to use to output
         """
-        ret = []
-        for d in self.data:
+        return ''.join(self.iter_string(dumper))
+
+    def iter_string(self, dumper: OutputDataDumper) -> Iterator[str]:
+        """
+        Output file to string chunks using the dumper, generated one item at a time.
+        The chunks joined are the same as :func:`to_string`.
+
+        :param dumper: dumper to use to output
+        """
+        return _join_lines(self.iter_parts(dumper))
+
+    def iter_parts(self, dumper: OutputDataDumper) -> Iterator[str]:
+        """
+        Output file parts using the dumper, which are joined by newlines.
+
+        :param dumper: dumper to use to output
+        """
+        for d in self.iter_data():
             if d is None:
                 continue
-            ret.append(dumper.dump(d))
-        return '\n'.join(ret)
+            yield dumper.dump(d)
 
 
 class OutputDriver:
@@ -133,6 +194,17 @@ class OutputDriver:
         """
         pass
 
+    def write_file_chunks(self, file: OutputFile, filename: str, chunks: Iterable[str]) -> None:
+        """
+        Outputs a file from string chunks, generated while they are consumed.
+        By default they are joined and passed to :func:`write_file`.
+
+        :param file: file to output
+        :param filename: output file name
+        :param chunks: file contents chunks
+        """
+        self.write_file(file, filename, ''.join(chunks))
+
 
 class OutputProject:
     """
@@ -171,10 +243,27 @@ class OutputProject:
         odd = OutputDataDumperDefault(shfiles)
 
         for fidx, f in enumerate(self.out_sequence):
-            driver.write_file(f, f.output_filename(fidx), f.to_string(odd))
+            driver.write_file_chunks(f, f.output_filename(fidx), _file_chunks(f, odd))
 
         for fidx, f in enumerate(self.out_single):
-            driver.write_file(f, f.output_filename(), f.to_string(odd))
+            driver.write_file_chunks(f, f.output_filename(), _file_chunks(f, odd))
+
+
+def _file_chunks(file: OutputFile, dumper: OutputDataDumper) -> Iterable[str]:
+    if type(file).to_string is not OutputFile.to_string:
+        # files that customize to_string are output as a single chunk
+        return [file.to_string(dumper)]
+    return file.iter_string(dumper)
+
+
+def _join_lines(parts: Iterable[str]) -> Iterator[str]:
+    """Yields the parts separated by newlines, like :func:`str.join`."""
+    first = True
+    for part in parts:
+        if not first:
+            yield '\n'
+        first = False
+        yield part
 
 
 #
@@ -195,14 +284,10 @@ class OutputFile_ShellScript(OutputFile):
     def file_executable(self) -> bool:
         return True
 
-    def to_string(self, dumper: OutputDataDumper) -> str:
-        ret = [
-            '#!/bin/bash',
-            '',
-            super().to_string(dumper),
-            ''
-        ]
-        return '\n'.join(ret)
+    def iter_string(self, dumper: OutputDataDumper) -> Iterator[str]:
+        yield '#!/bin/bash\n\n'
+        yield from super().iter_string(dumper)
+        yield '\n'
 
 
 class OutputFile_Yaml(OutputFile):
@@ -213,31 +298,29 @@ class OutputFile_Yaml(OutputFile):
     def yaml_params(self) -> Mapping[Any, Any]:
         return {'default_flow_style': False, 'sort_keys': False}
 
-    def to_string(self, dumper: OutputDataDumper) -> str:
+    def iter_parts(self, dumper: OutputDataDumper) -> Iterator[str]:
         if self.data is None:
-            return ''
+            return
         yaml_dump_params: Mapping[Any, Any] = self.yaml_params()
-        ret = []
         is_first: bool = True
-        for d in self.data:
+        for d in self.iter_data():
             if d is None:
                 continue
             if isinstance(d, OD_Raw):
-                ret.append(dumper.dump(d))
+                yield dumper.dump(d)
                 continue
             if not is_first:
-                ret.append('---')
+                yield '---'
             if isinstance(d, Sequence) and len(d) == 0:
                 continue
             is_first = False
             if not isinstance(d, str) and (isinstance(d, Mapping) or isinstance(d, Sequence)):
                 if isinstance(d, Sequence):
-                    ret.append(yaml.dump_all(d, Dumper=yaml.SafeDumper, **yaml_dump_params))
+                    yield yaml.dump_all(d, Dumper=yaml.SafeDumper, **yaml_dump_params)
                 else:
-                    ret.append(yaml.dump(d, Dumper=yaml.SafeDumper, **yaml_dump_params))
+                    yield yaml.dump(d, Dumper=yaml.SafeDumper, **yaml_dump_params)
             else:
-                ret.append(dumper.dump(d))
-        return '\n'.join(ret)
+                yield dumper.dump(d)
 
 
 class OutputFile_Kubernetes(OutputFile_Yaml):
@@ -257,6 +340,13 @@ class OutputDriver_Print(OutputDriver):
         print(filecontents)
         print('****** END FILE: {} ********'.format(filename))
 
+    def write_file_chunks(self, file: OutputFile, filename: str, chunks: Iterable[str]) -> None:
+        print('****** BEGIN FILE: {} ********'.format(filename))
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+        print()
+        print('****** END FILE: {} ********'.format(filename))
+
 
 class OutputDriver_Directory(OutputDriver):
     """
@@ -272,9 +362,13 @@ class OutputDriver_Directory(OutputDriver):
             os.makedirs(path)
 
     def write_file(self, file: OutputFile, filename, filecontents) -> None:
+        self.write_file_chunks(file, filename, [filecontents])
+
+    def write_file_chunks(self, file: OutputFile, filename: str, chunks: Iterable[str]) -> None:
         outfilename = os.path.join(self.path, filename)
         with open(outfilename, 'w', newline=file.file_newline(), encoding=file.file_encoding()) as fl:
-            fl.write(filecontents)
+            for chunk in chunks:
+                fl.write(chunk)
         if file.file_executable():
             st = os.stat(outfilename)
             os.chmod(outfilename, st.st_mode | stat.S_IEXEC)
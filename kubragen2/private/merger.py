@@ -1,6 +1,15 @@
+import copy
+from typing import Mapping, Optional
+
 import deepmerge  # type: ignore
 
 from ..exception import MergeError, InvalidParamError
+from ..option import Option
+
+_SCALAR_TYPES = frozenset([str, int, float, bool, bytes, type(None)])
+
+# the key of the item field name in the compiled list keys nodes, can't conflict with the path names
+_KEY_FIELD = object()
 
 
 def option_check_key_exist(config, path, base, nxt):
@@ -28,3 +37,269 @@ def option_merge_fallback(config, path, base, nxt):
     raise MergeError("Merge fallback: {}, {}".format(
         repr(base), repr(nxt)
     ))
+
+
+class _MergeFailure(Exception):
+    """
+    Raised inside :class:`Merger`, the path is built in reverse order while the error propagates, so it is only
+    built if there is an error.
+    """
+    def __init__(self):
+        super().__init__()
+        self.path = []
+
+
+class _MergeTypeConflict(_MergeFailure):
+    def __init__(self, base, nxt):
+        super().__init__()
+        self.base = base
+        self.nxt = nxt
+
+
+class _MergeUnknownKey(_MergeFailure):
+    def __init__(self, key):
+        super().__init__()
+        self.path.append(key)
+
+
+class Merger:
+    """
+    A dict/list merger with the same semantics as a :class:`deepmerge.Merger` using the "append" list
+    strategy, the "merge" dict strategy, and the "override" fallback strategy, without its generic strategy
+    dispatch.
+
+    Like deepmerge, dicts are merged into *base*, which is changed, and lists are appended into new lists.
+
+    :param create_keys: if False, dict keys that don't exist in base raise :class:`InvalidParamError`,
+        like :func:`option_check_key_exist`
+    :param type_conflict_override: if True, values of conflicting types are overridden, otherwise a
+        :class:`MergeError` is raised, like :func:`option_type_conflict`
+    :param option_override: if True, :class:`kubragen2.option.Option` values in base are always overridden,
+        like :class:`kubragen2.private.optionsmerger.OptionsMerger`
+    :param list_keys: a Mapping of dotted dict paths to an item field name. The lists at these paths are merged
+        by that field, like the Kubernetes strategic merge patch: an item of *nxt* is merged with the item of
+        *base* that has the same field value, and appended if there is none. Items that are not dicts or don't
+        have the field are appended. Inside these lists, the paths continue on the item fields, for example
+        ``{'spec.containers': 'name', 'spec.containers.env': 'name'}``.
+    """
+    __slots__ = ('create_keys', 'type_conflict_override', 'option_override', 'list_keys', '_list_keys')
+
+    def __init__(self, create_keys: bool = True, type_conflict_override: bool = False,
+                 option_override: bool = False, list_keys: Optional[Mapping[str, str]] = None):
+        self.create_keys = create_keys
+        self.type_conflict_override = type_conflict_override
+        self.option_override = option_override
+        self.list_keys = list_keys
+        self._list_keys = _compile_list_keys(list_keys) if list_keys else None
+
+    def merge(self, base, nxt):
+        """
+        Merges *nxt* into *base*.
+
+        :return: the merged value
+        :raises InvalidParamError: on unknown dict keys, if *create_keys* is False
+        :raises MergeError: on type conflicts, if *type_conflict_override* is False
+        """
+        return self.value_strategy([], base, nxt)
+
+    def merged(self, base, nxt):
+        """
+        Returns the result of merging *nxt* into *base*, without changing them. The dicts that need to
+        change are copied, and all other values are shared with *base* and *nxt*, so the result must not be
+        changed in place if they are still used, except for the dicts and lists that are known to be new.
+
+        :return: the merged value
+        :raises InvalidParamError: on unknown dict keys, if *create_keys* is False
+        :raises MergeError: on type conflicts, if *type_conflict_override* is False
+        """
+        try:
+            return self._merged(base, nxt, self._list_keys)
+        except _MergeUnknownKey as e:
+            raise InvalidParamError('Unknown option: "{}"'.format('.'.join(e.path[::-1]))) from None
+        except _MergeTypeConflict as e:
+            # raises MergeError
+            option_type_conflict(self, e.path[::-1], e.base, e.nxt)
+            raise
+
+    def merge_all(self, values):
+        """
+        Merges a list of values in order, merging each one into the result of the previous merges with
+        :func:`merged`, without changing them.
+
+        :param values: the values to merge, must not be empty
+        :return: the merged value
+        """
+        ret = values[0]
+        for value in values[1:]:
+            ret = self.merged(ret, value)
+        return ret
+
+    def value_strategy(self, path, base, nxt):
+        """
+        Merges *nxt* into *base*, which are at *path*. Same as :func:`deepmerge.Merger.value_strategy`.
+        """
+        keys = self._list_keys
+        for name in path:
+            if keys is None:
+                break
+            keys = keys.get(name)
+        try:
+            return self._merge(base, nxt, keys)
+        except _MergeUnknownKey as e:
+            raise InvalidParamError('Unknown option: "{}"'.format('.'.join(path + e.path[::-1]))) from None
+        except _MergeTypeConflict as e:
+            # raises MergeError
+            option_type_conflict(self, path + e.path[::-1], e.base, e.nxt)
+            raise
+
+    def _merge(self, base, nxt, keys):
+        if self.option_override and isinstance(base, Option):
+            return nxt
+        if isinstance(base, dict):
+            if isinstance(nxt, dict):
+                if not self.create_keys:
+                    for k in nxt:
+                        if k not in base:
+                            raise _MergeUnknownKey(k)
+                merge = self._merge
+                for k, v in nxt.items():
+                    if k not in base:
+                        base[k] = v
+                    else:
+                        bv = base[k]
+                        # scalars of the same type are the most common case
+                        if type(bv) is type(v) and type(v) in _SCALAR_TYPES:
+                            base[k] = v
+                            continue
+                        try:
+                            base[k] = merge(bv, v, keys.get(k) if keys is not None else None)
+                        except _MergeFailure as e:
+                            e.path.append(k)
+                            raise
+                return base
+        elif isinstance(base, list) and isinstance(nxt, list):
+            if keys is not None and _KEY_FIELD in keys:
+                return _merge_keyed(base, nxt, keys, self._merge)
+            return base + nxt
+        if isinstance(base, type(nxt)) or isinstance(nxt, type(base)) or self.type_conflict_override:
+            return nxt
+        raise _MergeTypeConflict(base, nxt)
+
+    def _merged(self, base, nxt, keys):
+        if self.option_override and isinstance(base, Option):
+            return nxt
+        if isinstance(base, dict):
+            if isinstance(nxt, dict):
+                if not self.create_keys:
+                    for k in nxt:
+                        if k not in base:
+                            raise _MergeUnknownKey(k)
+                ret = dict(base) if type(base) is dict else copy.copy(base)
+                merged = self._merged
+                for k, v in nxt.items():
+                    if k not in ret:
+                        ret[k] = v
+                    else:
+                        bv = ret[k]
+                        if type(bv) is type(v) and type(v) in _SCALAR_TYPES:
+                            ret[k] = v
+                            continue
+                        try:
+                            ret[k] = merged(bv, v, keys.get(k) if keys is not None else None)
+                        except _MergeFailure as e:
+                            e.path.append(k)
+                            raise
+                return ret
+        elif isinstance(base, list) and isinstance(nxt, list):
+            if keys is not None and _KEY_FIELD in keys:
+                return _merge_keyed(base, nxt, keys, self._merged)
+            return base + nxt
+        if isinstance(base, type(nxt)) or isinstance(nxt, type(base)) or self.type_conflict_override:
+            return nxt
+        raise _MergeTypeConflict(base, nxt)
+
+
+def _compile_list_keys(list_keys):
+    """
+    Compiles the :class:`Merger` *list_keys* to a tree of dicts by path name, where the nodes of the keyed lists
+    have the item field name in the :data:`_KEY_FIELD` key.
+    """
+    root = {}
+    for path, field in list_keys.items():
+        node = root
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+        node[_KEY_FIELD] = field
+    return root
+
+
+def _merge_keyed(base, nxt, keys, merge):
+    """
+    Merges the items of the *nxt* list into a new list with the items of *base*, using a hash index of the item
+    field values.
+    """
+    field = keys[_KEY_FIELD]
+    ret = list(base)
+    index = {}
+    for position, item in enumerate(ret):
+        if isinstance(item, dict) and field in item:
+            index.setdefault(item[field], position)
+    for item in nxt:
+        if isinstance(item, dict) and field in item:
+            name = item[field]
+            position = index.get(name)
+            if position is not None:
+                try:
+                    ret[position] = merge(ret[position], item, keys)
+                except _MergeFailure as e:
+                    e.path.append(str(name))
+                    raise
+                continue
+            index[name] = len(ret)
+        ret.append(item)
+    return ret
+
+
+def kway_contributors(values):
+    """
+    Returns the values that contribute to the merge of a list of values in order of decreasing priority,
+    when type conflicts are overridden. Dicts are merged with the dicts below them, lists are appended to the
+    lists below them, and any other value overrides the ones below it.
+    """
+    top = values[0]
+    if isinstance(top, dict):
+        kind = dict
+    elif isinstance(top, list):
+        kind = list
+    else:
+        return values[:1]
+    for index in range(1, len(values)):
+        if not isinstance(values[index], kind):
+            return values[:index]
+    return values
+
+
+def kway_merge(values):
+    """
+    Merges a list of values in order of decreasing priority in a single pass, without changing them, with the
+    same result as the pairwise merge when type conflicts are overridden. A value without others to merge with
+    is returned as-is.
+    """
+    values = kway_contributors(values)
+    if len(values) == 1:
+        return values[0]
+    if isinstance(values[0], list):
+        return [item for value in reversed(values) for item in value]
+    # the result has the type of the lowest dict, like in the pairwise merge
+    bottom = values[-1]
+    if type(bottom) is dict:
+        ret = {}
+    else:
+        ret = copy.copy(bottom)
+        ret.clear()
+    for value in reversed(values):
+        for key, item in value.items():
+            if key not in ret:
+                items = [v[key] for v in values if key in v]
+                ret[key] = item if len(items) == 1 else kway_merge(items)
+    return ret
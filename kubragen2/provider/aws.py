@@ -29,7 +29,7 @@ class KData_PersistentVolume_AWSElasticBlockStore(KData_PersistentVolume):
         self.convert_csi = convert_csi
 
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        ret = copy.deepcopy(super().internal_build(req))
+        ret = super().internal_build(req)
         ret['spec']['awsElasticBlockStore'] = {}
 
         config = req.get_config(KData_PersistentVolume_AWSElasticBlockStore.Config)
@@ -55,15 +55,16 @@ class KData_PersistentVolume_AWSElasticBlockStore(KData_PersistentVolume):
             ret['spec']['storageClassName'] = ''
 
         if config is not None and config.merge_config is not None:
-            ret = merger.merge(ret, config.merge_config)
+            ret = merger.merged(ret, copy.deepcopy(config.merge_config))
         return ret
 
+    def claim_clears_storageclass(self, pv: Mapping[Any, Any]) -> bool:
+        return 'volumeID' in pv['spec']['awsElasticBlockStore'] and pv['spec']['awsElasticBlockStore']['volumeID'] != ''
+
     def build_claim(self, pvc: KData_PersistentVolumeClaim, req: KData_PersistentVolumeClaim_Request) -> Mapping[Any, Any]:
         ret = dict(super().build_claim(pvc, req))
-        if req.pvreq is not None:
-            pv = self.build(req.pvreq)
-            if 'volumeID' in pv['spec']['awsElasticBlockStore'] and pv['spec']['awsElasticBlockStore']['volumeID'] != '':
-                ret['spec']['storageClassName'] = ''
+        if req.pvreq is not None and self._claim_clears_storageclass(req.pvreq):
+            ret['spec']['storageClassName'] = ''
         return ret
 
 
@@ -78,9 +79,9 @@ class KData_PersistentVolume_CSI_AWSEBS(KData_PersistentVolume_CSI):
         self.nodriver = nodriver
 
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        ret = dict(super().internal_build(req))
+        ret = super().internal_build(req)
         if not self.nodriver:
-            ret['spec']['csi']['driver'] = 'ebs.csi.aws.com'
+            ret = merger.merged(ret, {'spec': {'csi': {'driver': 'ebs.csi.aws.com'}}})
         return ret
 
 
@@ -95,7 +96,7 @@ class KData_PersistentVolume_CSI_AWSEFS(KData_PersistentVolume_CSI):
         self.nodriver = nodriver
 
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        ret = dict(super().internal_build(req))
+        ret = super().internal_build(req)
         if not self.nodriver:
-            ret['spec']['csi']['driver'] = 'efs.csi.aws.com'
+            ret = merger.merged(ret, {'spec': {'csi': {'driver': 'efs.csi.aws.com'}}})
         return ret
@@ -27,7 +27,7 @@ class KData_PersistentVolume_AzureDisk(KData_PersistentVolume):
             self.readOnly = readOnly
 
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        ret = copy.deepcopy(super().internal_build(req))
+        ret = super().internal_build(req)
         ret['spec']['azureDisk'] = {}
 
         config = req.get_config(KData_PersistentVolume_AzureDisk.Config)
@@ -47,13 +47,14 @@ class KData_PersistentVolume_AzureDisk(KData_PersistentVolume):
             ret['spec']['storageClassName'] = ''
 
         if config is not None and config.merge_config is not None:
-            ret = merger.merge(ret, config.merge_config)
+            ret = merger.merged(ret, copy.deepcopy(config.merge_config))
         return ret
 
+    def claim_clears_storageclass(self, pv: Mapping[Any, Any]) -> bool:
+        return 'diskURI' in pv['spec']['azureDisk'] and pv['spec']['azureDisk']['diskURI'] != ''
+
     def build_claim(self, pvc: KData_PersistentVolumeClaim, req: KData_PersistentVolumeClaim_Request) -> Mapping[Any, Any]:
         ret = dict(super().build_claim(pvc, req))
-        if req.pvreq is not None:
-            pv = self.build(req.pvreq)
-            if 'diskURI' in pv['spec']['azureDisk'] and pv['spec']['azureDisk']['diskURI'] != '':
-                ret['spec']['storageClassName'] = ''
+        if req.pvreq is not None and self._claim_clears_storageclass(req.pvreq):
+            ret['spec']['storageClassName'] = ''
         return ret
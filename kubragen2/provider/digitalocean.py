@@ -19,11 +19,11 @@ class KData_PersistentVolume_CSI_DOBS(KData_PersistentVolume_CSI):
         self.nodriver = nodriver
 
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        ret = dict(super().internal_build(req))
+        ret = super().internal_build(req)
         if not self.nodriver:
-            ret['spec']['csi']['driver'] = 'dobs.csi.digitalocean.com'
+            ret = merger.merged(ret, {'spec': {'csi': {'driver': 'dobs.csi.digitalocean.com'}}})
         if self.noformat is not None:
-            ret = merger.merge(ret, {
+            ret = merger.merged(ret, {
                 'spec': {
                     'csi': {
                         'volumeAttributes': {
@@ -34,7 +34,7 @@ class KData_PersistentVolume_CSI_DOBS(KData_PersistentVolume_CSI):
             })
         if 'volumeHandle' in ret['spec']['csi'] and ret['spec']['csi']['volumeHandle'] is not None:
             # https://github.com/digitalocean/csi-digitalocean/blob/master/examples/kubernetes/pod-single-existing-volume/README.md
-            merger.merge(ret, {
+            ret = merger.merged(ret, {
                 'metadata': {
                     'annotations': {
                         'pv.kubernetes.io/provisioned-by': 'dobs.csi.digitalocean.com',
@@ -30,7 +30,7 @@ class KData_PersistentVolume_GCEPersistentDisk(KData_PersistentVolume):
         self.convert_csi = convert_csi
 
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        ret = copy.deepcopy(super().internal_build(req))
+        ret = super().internal_build(req)
         ret['spec']['gcePersistentDisk'] = {}
 
         config = req.get_config(KData_PersistentVolume_GCEPersistentDisk.Config)
@@ -56,15 +56,16 @@ class KData_PersistentVolume_GCEPersistentDisk(KData_PersistentVolume):
             ret['spec']['storageClassName'] = ''
 
         if config is not None and config.merge_config is not None:
-            ret = merger.merge(ret, config.merge_config)
+            ret = merger.merged(ret, copy.deepcopy(config.merge_config))
         return ret
 
+    def claim_clears_storageclass(self, pv: Mapping[Any, Any]) -> bool:
+        return 'pdName' in pv['spec']['gcePersistentDisk'] and pv['spec']['gcePersistentDisk']['pdName'] != ''
+
     def build_claim(self, pvc: KData_PersistentVolumeClaim, req: KData_PersistentVolumeClaim_Request) -> Mapping[Any, Any]:
         ret = dict(super().build_claim(pvc, req))
-        if req.pvreq is not None:
-            pv = self.build(req.pvreq)
-            if 'pdName' in pv['spec']['gcePersistentDisk'] and pv['spec']['gcePersistentDisk']['pdName'] != '':
-                ret['spec']['storageClassName'] = ''
+        if req.pvreq is not None and self._claim_clears_storageclass(req.pvreq):
+            ret['spec']['storageClassName'] = ''
         return ret
 
 
@@ -79,7 +80,7 @@ class KData_PersistentVolume_CSI_GCEPD(KData_PersistentVolume_CSI):
         self.nodriver = nodriver
 
     def internal_build(self, req: KData_PersistentVolume_Request) -> Mapping[Any, Any]:
-        ret = dict(super().internal_build(req))
+        ret = super().internal_build(req)
         if not self.nodriver:
-            ret['spec']['csi']['driver'] = 'pd.csi.storage.gke.io'
+            ret = merger.merged(ret, {'spec': {'csi': {'driver': 'pd.csi.storage.gke.io'}}})
         return ret
@@ -0,0 +1,17 @@
+import os
+import timeit
+import unittest
+from typing import Any, Callable
+
+benchmark = unittest.skipUnless(os.environ.get('KUBRAGEN2_BENCHMARK'),
+                                'set KUBRAGEN2_BENCHMARK=1 to run the benchmarks')
+"""Marks benchmark tests, which only report timings and are skipped by default."""
+
+
+def report_timings(title: str, number: int, **funcs: Callable[[], Any]) -> None:
+    """
+    Prints the best time of each function, running it *number* times per repetition.
+    """
+    timings = {name: min(timeit.repeat(func, number=number, repeat=3)) for name, func in funcs.items()}
+    print('\n{}: {}'.format(title, ', '.join('{} {:.4f}s'.format(name, timing)
+                                             for name, timing in timings.items())))
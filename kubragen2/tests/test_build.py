@@ -1,8 +1,13 @@
+import asyncio
+import sys
 import unittest
 
-from kubragen2.build import BuildData
-from kubragen2.data import DataIsNone, DisabledData, ValueData, DataGetValue
-from kubragen2.exception import InvalidParamError
+from kubragen2.build import BuildData, BuildDataBatch, IterBuildData, BuildPlan, BuildObserver, \
+    AsyncBuildData, DataBuilder, _compact_sequence
+from kubragen2.data import DataIsNone, DisabledData, ValueData, DataGetValue, BaseData, AsyncCallableData
+from kubragen2.exception import InvalidParamError, BuildError, InvalidOperationError
+from kubragen2.output import OutputFile_Kubernetes, OutputDataDumper
+from kubragen2.tests import benchmark, report_timings
 
 
 class TestData(unittest.TestCase):
@@ -62,3 +67,340 @@ class TestData(unittest.TestCase):
 
         BuildData(data, in_place=True)
         self.assertNotIsInstance(data['y'], ValueData)
+
+    def test_build_data_sequence_order(self):
+        order = []
+
+        class OrderData(ValueData):
+            def get_value(self):
+                order.append(self.value)
+                return super().get_value()
+
+        data = [OrderData(1), OrderData(2, enabled=False), {'a': OrderData(3)}, OrderData(4)]
+        BuildData(data)
+        self.assertEqual(data, [1, {'a': 3}, 4])
+        self.assertEqual(order, [4, 1, 3])
+
+    def test_build_data_nested_value(self):
+        data = {
+            'a': ValueData({'b': ValueData(1), 'c': [ValueData(2, enabled=False), ValueData(3)]}),
+        }
+        BuildData(data)
+        self.assertEqual(data, {'a': {'b': 1, 'c': [3]}})
+
+    def test_build_data_deep(self):
+        data = {}
+        current = data
+        for i in range(sys.getrecursionlimit() * 2):
+            current['x'] = {'y': ValueData(i)}
+            current = current['x']
+        BuildData(data)
+        self.assertEqual(data['x']['x']['y'], 1)
+
+    def test_build_data_copy_on_write(self):
+        shared = {'a': 1, 'b': [1, 2]}
+        data = {
+            'x': shared,
+            'y': {
+                'z': [ValueData(1, enabled=False), {'k': 2}, ValueData(3, enabled=False), {'k': ValueData(4)}],
+            },
+        }
+        ndata = BuildData(data, in_place=False)
+        self.assertEqual(ndata, {
+            'x': {'a': 1, 'b': [1, 2]},
+            'y': {
+                'z': [{'k': 2}, {'k': 4}],
+            },
+        })
+        self.assertIs(ndata['x'], shared)
+        self.assertIs(ndata['y']['z'][0], data['y']['z'][1])
+        self.assertIsNot(ndata['y']['z'][1], data['y']['z'][3])
+        self.assertIsInstance(data['y']['z'][0], ValueData)
+        self.assertIsInstance(data['y']['z'][3]['k'], ValueData)
+
+    def test_build_data_copy_on_write_unchanged(self):
+        data = {'x': {'y': [1, 2, {'z': 3}]}}
+        self.assertIs(BuildData(data, in_place=False), data)
+
+    def test_build_data_batch(self):
+        data = [{'x': ValueData(i), 'y': [ValueData(i, enabled=False)]} for i in range(40)]
+        expected = [{'x': i, 'y': []} for i in range(40)]
+        self.assertEqual(BuildDataBatch(data, in_place=False, max_workers=2), expected)
+        self.assertEqual(BuildDataBatch(data, in_place=False, max_workers=2, use_processes=False), expected)
+        self.assertEqual(BuildDataBatch(data[:3], in_place=False), expected[:3])
+        self.assertIsInstance(data[0]['x'], ValueData)
+
+    def test_build_data_batch_error(self):
+        data = [{'x': ValueData(i)} for i in range(20)]
+        data[13]['y'] = BaseData()
+        with self.assertRaises(BuildError) as cm:
+            BuildDataBatch(data, max_workers=2, use_processes=False)
+        self.assertEqual(cm.exception.index, 13)
+        self.assertIsInstance(cm.exception.error, InvalidOperationError)
+
+    def test_build_data_shared(self):
+        calls = []
+
+        class CountData(ValueData):
+            def get_value(self):
+                calls.append(self.value)
+                return super().get_value()
+
+        labels = {'app': CountData('myapp'), 'tier': ValueData('db', enabled=False)}
+        env = [CountData('x'), DisabledData()]
+        data = {
+            'a': {'labels': labels, 'env': env},
+            'b': {'labels': labels, 'env': env},
+            'c': [labels, env],
+        }
+        ndata = BuildData(data, in_place=False)
+        self.assertEqual(ndata, {
+            'a': {'labels': {'app': 'myapp'}, 'env': ['x']},
+            'b': {'labels': {'app': 'myapp'}, 'env': ['x']},
+            'c': [{'app': 'myapp'}, ['x']],
+        })
+        self.assertIs(ndata['a']['labels'], ndata['b']['labels'])
+        self.assertIs(ndata['a']['env'], ndata['c'][1])
+        self.assertEqual(sorted(calls), ['myapp', 'x'])
+        self.assertIsInstance(labels['app'], ValueData)
+
+        calls.clear()
+        BuildData(data)
+        self.assertEqual(data, ndata)
+        self.assertEqual(sorted(calls), ['myapp', 'x'])
+
+    def test_build_data_cycle(self):
+        data = {'a': {'b': [1, 2]}}
+        data['a']['b'].append(data['a'])
+        with self.assertRaisesRegex(InvalidOperationError, r'"a\.b\.2"'):
+            BuildData(data)
+
+    def test_iter_build_data(self):
+        consumed = []
+
+        def documents():
+            for i in range(3):
+                consumed.append(i)
+                yield {'x': ValueData(i), 'y': DisabledData()}
+
+        it = IterBuildData(documents())
+        self.assertEqual(consumed, [])
+        self.assertEqual(next(it), {'x': 0})
+        self.assertEqual(consumed, [0])
+        self.assertEqual(list(it), [{'x': 1}, {'x': 2}])
+
+    def test_iter_build_data_error(self):
+        with self.assertRaises(BuildError) as cm:
+            list(IterBuildData([{'x': 1}, [BaseData()]]))
+        self.assertEqual(cm.exception.index, 1)
+
+    def test_build_data_compaction(self):
+        data = [ValueData(i, enabled=i % 2 == 1) for i in range(10000)]
+        alias = data
+        BuildData(data)
+        self.assertIs(alias, data)
+        self.assertEqual(data, list(range(1, 10000, 2)))
+
+    def test_compact_sequence(self):
+        removed = list(range(9998, -1, -2))
+        data = list(range(10000))
+        _compact_sequence(data, removed)
+        self.assertEqual(data, list(range(1, 10000, 2)))
+
+    @benchmark
+    def test_build_data_compaction_benchmark(self):
+        # 10k items with half of them removed: compaction vs removing each item with del
+        removed = list(range(9998, -1, -2))
+
+        def delete_each(data):
+            for index in removed:
+                del data[index]
+
+        report_timings('10k items, half removed', 10, compaction=lambda: _compact_sequence(list(range(10000)), removed),
+                       delete=lambda: delete_each(list(range(10000))))
+
+    def test_build_data_prune(self):
+        data = {
+            'metadata': {'name': 'x', 'annotations': {'a': ValueData(1, enabled=False)}},
+            'spec': {
+                'selector': {'matchLabels': {'app': DisabledData()}},
+                'env': [DisabledData(), {'name': ValueData(None)}, None, 'x'],
+                'volumes': [{'name': 'data', 'emptyDir': {}}],
+                'value': ValueData(None),
+            },
+        }
+        ndata = BuildData(data, in_place=False, prune=True)
+        self.assertEqual(ndata, {
+            'metadata': {'name': 'x'},
+            'spec': {
+                'env': ['x'],
+                'volumes': [{'name': 'data', 'emptyDir': {}}],
+            },
+        })
+        self.assertIn('annotations', data['metadata'])
+
+        BuildData(data, prune=True, prune_keep=['spec.selector.*'])
+        self.assertEqual(data, {
+            'metadata': {'name': 'x'},
+            'spec': {
+                'selector': {'matchLabels': {}},
+                'env': ['x'],
+                'volumes': [{'name': 'data'}],
+            },
+        })
+
+    def test_build_data_prune_shared(self):
+        empty = {'a': DisabledData()}
+        data = {'x': [empty, 1, empty], 'y': {'z': empty}}
+        self.assertEqual(BuildData(data, prune=True), {'x': [1]})
+
+    def test_build_plan(self):
+        labels = {'app': 'x'}
+        template = {
+            'metadata': {'name': 'x', 'labels': labels},
+            'spec': {
+                'replicas': ValueData(2),
+                'env': [1, ValueData(2, enabled=False), {'a': [ValueData(3)]}, ValueData(4, enabled=False), 5],
+                'value': ValueData({'b': ValueData(6, enabled=False), 'c': 7}),
+            },
+        }
+        plan = BuildPlan(template)
+        expected = BuildData(template, in_place=False)
+        for _ in range(2):
+            data = plan.build()
+            self.assertEqual(data, expected)
+            self.assertEqual(data, {
+                'metadata': {'name': 'x', 'labels': {'app': 'x'}},
+                'spec': {
+                    'replicas': 2,
+                    'env': [1, {'a': [3]}, 5],
+                    'value': {'c': 7},
+                },
+            })
+            self.assertIs(data['metadata'], template['metadata'])
+        self.assertIsInstance(template['spec']['replicas'], ValueData)
+        self.assertIs(BuildPlan(labels).build(), labels)
+
+    def test_build_plan_cycle(self):
+        data = {'a': [ValueData(1)]}
+        data['a'].append(data)
+        with self.assertRaisesRegex(InvalidOperationError, r'"a\.1"'):
+            BuildPlan(data)
+
+    def test_build_data_observer(self):
+        class Observer(BuildObserver):
+            def __init__(self):
+                self.stats = []
+
+            def build_finished(self, stats):
+                self.stats.append(stats)
+
+        observer = Observer()
+        data = {
+            'a': {'x': ValueData(1), 'y': [DisabledData(), DisabledData(), 3]},
+            'b': [ValueData(2), {'z': ValueData(None)}],
+            'c': 1,
+        }
+        BuildData(data, prune=True, observer=observer)
+        self.assertEqual(data, {'a': {'x': 1, 'y': [3]}, 'b': [2], 'c': 1})
+        self.assertEqual(len(observer.stats), 1)
+        stats = observer.stats[0]
+        self.assertEqual(stats.nodes, 5)
+        self.assertEqual(stats.items, 11)
+        self.assertEqual(stats.data_resolved, 5)
+        self.assertEqual(stats.removed, 4)
+        self.assertEqual(list(stats.keys.keys()), ['a', 'b'])
+        self.assertEqual(stats.keys['a'].data_resolved, 3)
+        self.assertEqual(stats.keys['b'].removed, 2)
+        self.assertGreaterEqual(stats.duration, stats.keys['a'].duration + stats.keys['b'].duration)
+
+    def test_async_build_data(self):
+        running = []
+        max_running = []
+
+        def fetch(value):
+            async def func():
+                running.append(value)
+                max_running.append(len(running))
+                await asyncio.sleep(0.01)
+                running.remove(value)
+                return value
+            return func
+
+        shared = AsyncCallableData(fetch('shared'))
+        data = {
+            'a': [AsyncCallableData(fetch(i)) for i in range(6)],
+            'b': AsyncCallableData(fetch('disabled'), enabled=False),
+            'c': AsyncCallableData(fetch({'d': AsyncCallableData(fetch('nested'))})),
+            'e': ValueData(1),
+            'f': [shared, shared],
+        }
+        ndata = asyncio.run(AsyncBuildData(data, in_place=False, concurrency=2))
+        self.assertEqual(ndata, {
+            'a': [0, 1, 2, 3, 4, 5],
+            'c': {'d': 'nested'},
+            'e': 1,
+            'f': ['shared', 'shared'],
+        })
+        self.assertEqual(max(max_running), 2)
+        self.assertEqual(len(max_running), 9)
+
+    def test_async_build_data_value_data(self):
+        async def fetch():
+            return 'x'
+
+        data = {'a': ValueData({'b': AsyncCallableData(fetch)}), 'c': [ValueData([AsyncCallableData(fetch)])],
+                'd': ValueData({'e': AsyncCallableData(asyncio.sleep)}, enabled=False)}
+        self.assertEqual(asyncio.run(AsyncBuildData(data)), {'a': {'b': 'x'}, 'c': [['x']]})
+
+    def test_async_data_unresolved(self):
+        with self.assertRaises(InvalidOperationError):
+            BuildData({'a': AsyncCallableData(asyncio.sleep)})
+
+    def test_build_data_build_prop_override(self):
+        class HookBuilder(DataBuilder):
+            def build_prop(self, data, key):
+                if data[key] == 'x':
+                    data[key] = 'HOOK'
+                else:
+                    super().build_prop(data, key)
+
+        data = {'a': 'x', 'b': [ValueData('x'), DisabledData()], 'c': {'d': 'x'}}
+        self.assertEqual(HookBuilder().build(data, in_place=False), {'a': 'HOOK', 'b': ['x'], 'c': {'d': 'HOOK'}})
+        self.assertEqual(data['a'], 'x')
+        self.assertEqual(HookBuilder().build(data), {'a': 'HOOK', 'b': ['x'], 'c': {'d': 'HOOK'}})
+        self.assertEqual(DataBuilder().build({'a': 'x'}), {'a': 'x'})
+        template = {'a': 'x', 'b': [ValueData('y'), DisabledData()]}
+        self.assertEqual(BuildPlan(template).build(HookBuilder()), {'a': 'HOOK', 'b': ['y']})
+
+    def test_build_plan_observer(self):
+        class Observer(BuildObserver):
+            def __init__(self):
+                self.stats = []
+
+            def build_finished(self, stats):
+                self.stats.append(stats)
+
+        observer = Observer()
+        template = {'a': {'x': ValueData(1)}, 'b': [DisabledData(), 2]}
+        self.assertEqual(BuildPlan(template).build(DataBuilder(observer=observer)), {'a': {'x': 1}, 'b': [2]})
+        self.assertEqual(len(observer.stats), 1)
+        self.assertEqual(observer.stats[0].nodes, 3)
+        self.assertEqual(observer.stats[0].data_resolved, 2)
+        self.assertEqual(observer.stats[0].removed, 1)
+
+    def test_build_data_container_values_not_shared(self):
+        class ResourcesData(ValueData):
+            def get_value(self):
+                return {'limits': {'cpu': ValueData(self.value)}}
+
+        resources = ResourcesData('1')
+        for in_place in [True, False]:
+            data = {'a': {'resources': resources}, 'b': {'resources': resources}}
+            for result in [BuildData(data, in_place=in_place), BuildPlan(data).build()]:
+                self.assertEqual(result, {'a': {'resources': {'limits': {'cpu': '1'}}},
+                                          'b': {'resources': {'limits': {'cpu': '1'}}}})
+                self.assertIsNot(result['a']['resources'], result['b']['resources'])
+                file = OutputFile_Kubernetes('x.yaml')
+                file.append(result)
+                self.assertNotIn('&id', file.to_string(OutputDataDumper()))
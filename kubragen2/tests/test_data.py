@@ -1,7 +1,8 @@
+import tracemalloc
 import unittest
 
 from kubragen2.build import BuildData
-from kubragen2.data import DataIsNone, DisabledData, ValueData, DataGetValue
+from kubragen2.data import DataIsNone, DisabledData, ValueData, DataGetValue, DISABLED_DATA, Data, LazyData
 from kubragen2.exception import InvalidOperationError, InvalidParamError
 
 
@@ -62,3 +63,48 @@ class TestData(unittest.TestCase):
 
         BuildData(data, in_place=True)
         self.assertNotIsInstance(data['y'], ValueData)
+
+    def test_data_disabled_shared(self):
+        self.assertFalse(DISABLED_DATA.is_enabled())
+        with self.assertRaises(AttributeError):
+            DISABLED_DATA.enabled = True
+        self.assertEqual(BuildData([DISABLED_DATA, 1, DISABLED_DATA]), [1])
+
+    def test_data_slots_memory(self):
+        class DictValueData(Data):
+            def __init__(self, value=None, enabled=True):
+                self.value = value
+                self.enabled = enabled
+
+        def allocated(cls):
+            tracemalloc.start()
+            try:
+                items = [cls(i) for i in range(10000)]
+                size = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(len(items), 10000)
+            return size
+
+        slots_size = allocated(ValueData)
+        dict_size = allocated(DictValueData)
+        self.assertLess(slots_size, dict_size,
+                        'slots: {} bytes, dict: {} bytes, saved {} bytes'.format(
+                            slots_size, dict_size, dict_size - slots_size))
+
+    def test_data_lazy(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {'a': 1}
+
+        data = {
+            'x': LazyData(compute),
+            'y': ValueData({'z': LazyData(compute)}, enabled=False),
+            'w': LazyData(compute, enabled=lambda: False),
+        }
+        self.assertEqual(BuildData(data, in_place=False), {'x': {'a': 1}})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(DataGetValue(data['x']), {'a': 1})
+        self.assertEqual(len(calls), 1)
@@ -1,8 +1,17 @@
+import copy
 import unittest
 
-from kubragen2.data import Data
-from kubragen2.kdata import KData_ConfigMap, KData_Manual, KData_Secret
-from kubragen2.kdatahelper import KDataHelper_Env, KDataHelper_Volume
+from kubragen2.build import BuildData
+from kubragen2.configfile import ConfigFile_RawStr, ConfigFileRender_RawStr
+from kubragen2.data import Data, LazyData, ValueData
+from kubragen2.kdata import KData_ConfigMap, KData_Manual, KData_Secret, KData_PersistentVolume_Request, \
+    KData_PersistentVolumeClaim_Request, KData_PersistentVolume_CSI, KData_PersistentVolume_EmptyDir, \
+    KData_PersistentVolume_HostPath, KData_PersistentVolume_NFS, KData_PersistentVolumeClaim
+from kubragen2.kdatahelper import KDataHelper_Env, KDataHelper_Volume, KDataHelper_ConfigFile
+from kubragen2.options import Options
+from kubragen2.provider.aws import KData_PersistentVolume_AWSElasticBlockStore, KData_PersistentVolume_CSI_AWSEBS
+from kubragen2.provider.digitalocean import KData_PersistentVolume_CSI_DOBS
+from kubragen2.provider.gcloud import KData_PersistentVolume_CSI_GCEPD
 
 
 class TestKData(unittest.TestCase):
@@ -107,3 +116,130 @@ class TestKData(unittest.TestCase):
                 }],
             }
         })
+
+    def test_helper_configfile_lazy(self):
+        rendered = []
+
+        class CountingConfigFile(ConfigFile_RawStr):
+            def get_value(self, options):
+                rendered.append(1)
+                return super().get_value(options)
+
+        value = KDataHelper_ConfigFile.info(CountingConfigFile('a=1'), Options({}), [ConfigFileRender_RawStr()],
+                                            lazy=True)
+        self.assertIsInstance(value, LazyData)
+        self.assertEqual(BuildData({'x': ValueData({'y': value}, enabled=False)}), {})
+        self.assertEqual(len(rendered), 0)
+        self.assertEqual(BuildData({'x': value}), {'x': 'a=1'})
+        self.assertEqual(len(rendered), 1)
+
+    def test_persistentvolume_no_request_changes(self):
+        pvreq = KData_PersistentVolume_Request(
+            'pv', selector_labels={'app': 'x'}, storage='1Gi', access_modes=['ReadWriteOnce'],
+            merge_config={'metadata': {'labels': {'tier': 'db'}}, 'spec': {'accessModes': ['ReadOnlyMany']}},
+            configs=[
+                KData_PersistentVolume_CSI.Config({'volumeHandle': 'vol', 'volumeAttributes': {'a': 'b'}},
+                                                  merge_config={'metadata': {'labels': {'csi': 'y'}}}),
+                KData_PersistentVolume_HostPath.Config({'path': '/data'}),
+            ])
+        pvcreq = KData_PersistentVolumeClaim_Request('pvc', 'default', pvreq=pvreq,
+                                                     merge_config={'spec': {'selector': {'matchLabels': {'b': 1}}}})
+
+        def request_values():
+            return copy.deepcopy([{k: v for k, v in obj.__dict__.items() if k not in ('configs', 'pvreq')}
+                                  for obj in [pvreq, pvreq.configs[0], pvreq.configs[1], pvcreq]])
+
+        source = request_values()
+        for kdata in [KData_PersistentVolume_EmptyDir(), KData_PersistentVolume_HostPath(),
+                      KData_PersistentVolume_CSI(), KData_PersistentVolume_CSI_AWSEBS(),
+                      KData_PersistentVolume_CSI_GCEPD(), KData_PersistentVolume_CSI_DOBS(),
+                      KData_PersistentVolume_AWSElasticBlockStore()]:
+            pv = kdata.build(pvreq)
+            self.assertLessEqual({'app': 'x', 'tier': 'db'}.items(), pv['metadata']['labels'].items())
+            self.assertEqual(pv['spec']['accessModes'], ['ReadWriteOnce', 'ReadOnlyMany'])
+            kdata.build_claim(KData_PersistentVolumeClaim(), pvcreq)
+        self.assertEqual(KData_PersistentVolume_CSI_AWSEBS().build(pvreq)['spec']['csi'], {
+            'volumeHandle': 'vol', 'volumeAttributes': {'a': 'b'}, 'driver': 'ebs.csi.aws.com'})
+        self.assertEqual(KData_PersistentVolume_CSI_DOBS().build(pvreq)['spec']['csi']['volumeAttributes'], {
+            'a': 'b', 'com.digitalocean.csi/noformat': 'true'})
+        self.assertEqual(KData_PersistentVolume_AWSElasticBlockStore().build(pvreq)['metadata']['labels'], {
+            'app': 'x', 'csi': 'y', 'tier': 'db'})
+        self.assertEqual(request_values(), source)
+
+    def test_persistentvolume_build_cache(self):
+        builds = []
+
+        class CountingCSI(KData_PersistentVolume_CSI):
+            def internal_build(self, req):
+                builds.append(req.name)
+                return super().internal_build(req)
+
+        def claim(pvreq):
+            return kdata.build_claim(KData_PersistentVolumeClaim(), KData_PersistentVolumeClaim_Request(
+                pvreq.name, 'default', pvreq=pvreq))
+
+        kdata = CountingCSI()
+        pvreqs = [KData_PersistentVolume_Request('pv{}'.format(i), storage='1Gi', storageclassname='sc', configs=[
+            KData_PersistentVolume_CSI.Config({'volumeHandle': 'vol{}'.format(i)})]) for i in range(3)]
+        for pvreq in pvreqs:
+            pv = kdata.build(pvreq)
+            self.assertIsNot(kdata.build(pvreq), pv)
+            pv['spec']['csi'] = {}
+            pv['metadata']['namespace'] = 'x'
+            self.assertEqual(claim(pvreq)['spec']['storageClassName'], '')
+            self.assertNotIn('namespace', kdata.build(pvreq)['metadata'])
+        self.assertEqual(builds, ['pv0', 'pv0', 'pv0', 'pv1', 'pv1', 'pv1', 'pv2', 'pv2', 'pv2'])
+
+        builds.clear()
+        kdata.clear_storageclass_if_volumehandle = False
+        self.assertEqual(claim(pvreqs[0])['spec']['storageClassName'], 'sc')
+        pvreqs[1].configs[0] = KData_PersistentVolume_CSI.Config({})
+        kdata.clear_storageclass_if_volumehandle = True
+        self.assertEqual(claim(pvreqs[1])['spec']['storageClassName'], 'sc')
+        self.assertEqual(builds, ['pv0', 'pv1'])
+        # values changed in place
+        pvreqs[2].configs[0].csi['volumeHandle'] = ''
+        self.assertEqual(claim(pvreqs[2])['spec']['storageClassName'], 'sc')
+        pvreqs[2].merge_config = {'spec': {'csi': {'volumeHandle': 'vol'}}}
+        self.assertEqual(claim(pvreqs[2])['spec']['storageClassName'], '')
+        pvreqs[2].merge_config['spec']['csi']['volumeHandle'] = ''
+        self.assertEqual(claim(pvreqs[2])['spec']['storageClassName'], 'sc')
+        self.assertEqual(claim(pvreqs[2])['spec']['storageClassName'], 'sc')
+        self.assertEqual(builds, ['pv0', 'pv1', 'pv2', 'pv2', 'pv2'])
+        kdata.clear_cache()
+        claim(pvreqs[0])
+        self.assertEqual(builds, ['pv0', 'pv1', 'pv2', 'pv2', 'pv2', 'pv0'])
+
+    def test_persistentvolume_build_data_request_unchanged(self):
+        pvreq = KData_PersistentVolume_Request('pv', selector_labels={'app': ValueData('x')},
+                                               access_modes=[ValueData('ReadWriteOnce')], configs=[
+                KData_PersistentVolume_HostPath.Config({'path': '/data'})])
+        pvcreq = KData_PersistentVolumeClaim_Request('pvc', 'default', pvreq=pvreq)
+        kdata = KData_PersistentVolume_HostPath()
+        pv = BuildData(kdata.build(pvreq))
+        self.assertEqual(pv['metadata']['labels'], {'app': 'x'})
+        self.assertEqual(pv['spec']['accessModes'], ['ReadWriteOnce'])
+        self.assertEqual(BuildData({'spec': kdata.build_claim(KData_PersistentVolumeClaim(), pvcreq)['spec']})['spec'],
+                         {'selector': {'matchLabels': {'app': 'x'}}, 'accessModes': ['ReadWriteOnce']})
+        self.assertIsInstance(pvreq.selector_labels['app'], ValueData)
+        self.assertIsInstance(pvreq.access_modes[0], ValueData)
+
+    def test_persistentvolume_build_data_config_unchanged(self):
+        disabled = ValueData('x', enabled=False)
+        csi = {'driver': 'x', 'volumeHandle': 'vol', 'fsType': disabled, 'volumeAttributes': {'a': disabled}}
+        hostpath = {'path': '/data', 'type': disabled}
+        nfs = {'server': 'nfs', 'path': disabled}
+        for kdata, config, name, value, key in [
+            (KData_PersistentVolume_CSI(), KData_PersistentVolume_CSI.Config(csi), 'csi', csi, 'fsType'),
+            (KData_PersistentVolume_HostPath(), KData_PersistentVolume_HostPath.Config(hostpath), 'hostPath',
+             hostpath, 'type'),
+            (KData_PersistentVolume_NFS(), KData_PersistentVolume_NFS.Config(nfs), 'nfs', nfs, 'path'),
+        ]:
+            merge_config = {'metadata': {'annotations': {'a': disabled}}}
+            pvreq = KData_PersistentVolume_Request('pv', merge_config=merge_config, configs=[config])
+            pv = BuildData(kdata.build(pvreq))
+            self.assertEqual(pv['metadata']['annotations'], {})
+            self.assertNotIn(key, pv['spec'][name])
+            self.assertIs(value[key], disabled)
+            self.assertIs(merge_config['metadata']['annotations']['a'], disabled)
+        self.assertIs(csi['volumeAttributes']['a'], disabled)
@@ -0,0 +1,294 @@
+import collections
+import copy
+import random
+import re
+import unittest
+
+import deepmerge  # type: ignore
+
+from kubragen2.exception import MergeError, InvalidParamError
+from kubragen2.merger import merger, merger_nocreate
+from kubragen2.option import OptionValue, Option
+from kubragen2.options import optionsmerger
+from kubragen2.private.merger import Merger, kway_merge, option_check_key_exist, option_merge_fallback, option_type_conflict
+from kubragen2.private.optionsmerger import OptionsMerger
+from kubragen2.tests import benchmark, report_timings
+
+# the deepmerge mergers the merge engine must be equivalent to
+deepmerge_merger_nocreate = deepmerge.Merger(
+    [
+        (list, "append"),
+        (dict, [option_check_key_exist, "merge"]),
+    ],
+    ['override', option_merge_fallback], [option_type_conflict]
+)
+
+deepmerge_merger = deepmerge.Merger(
+    [
+        (list, "append"),
+        (dict, "merge"),
+    ],
+    ['override', option_merge_fallback], [option_type_conflict]
+)
+
+deepmerge_optionsmerger = OptionsMerger(
+    [
+        (list, "append"),
+        (dict, "merge"),
+    ],
+    ['override', option_merge_fallback], ['override', option_type_conflict]
+)
+
+
+def _random_value(rnd: random.Random, depth: int):
+    kind = rnd.randrange(12 if depth < 3 else 8)
+    if kind == 0:
+        return None
+    elif kind == 1:
+        return rnd.choice([True, False])
+    elif kind == 2:
+        return rnd.randrange(3)
+    elif kind == 3:
+        return rnd.choice([0.5, 1.0])
+    elif kind == 4:
+        return rnd.choice(['a', 'b', ''])
+    elif kind == 5:
+        return OptionValue(rnd.choice(['a', 'b.c']))
+    elif kind == 6:
+        return (1, 2)
+    elif kind == 7:
+        return [rnd.randrange(3) for _ in range(rnd.randrange(3))]
+    elif kind == 8:
+        return collections.OrderedDict(_random_items(rnd, depth + 1))
+    return dict(_random_items(rnd, depth + 1))
+
+
+def _random_items(rnd: random.Random, depth: int):
+    return [(rnd.choice(['a', 'b', 'c', 'd', 1]), _random_value(rnd, depth)) for _ in range(rnd.randrange(4))]
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return type(value).__name__, [(k, _normalize(v)) for k, v in value.items()]
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, Option):
+        return 'OptionValue', value.name
+    return type(value).__name__, value
+
+
+def _merge_result(merge, base, nxt):
+    try:
+        result = merge(base, nxt)
+    except Exception as e:
+        return 'error', type(e), re.sub(' at 0x[0-9a-f]+', '', str(e)), _normalize(base)
+    return 'result', _normalize(result), _normalize(base)
+
+
+def _benchmark_docs():
+    def make_base():
+        return {
+            'metadata': {'name': 'x', 'labels': {'app': 'x', 'tier': 'web'}},
+            'spec': {
+                'replicas': 1,
+                'template': {'spec': {'containers': [{'name': 'x'}], 'volumes': []}},
+                'options': {'key{}'.format(i): i for i in range(30)},
+            },
+        }
+
+    nxt = {
+        'metadata': {'labels': {'tier': 'api', 'env': 'prod'}},
+        'spec': {
+            'replicas': 3,
+            'template': {'spec': {'volumes': [{'name': 'data'}]}},
+            'options': {'key{}'.format(i): i * 2 for i in range(30)},
+        },
+    }
+    return make_base, nxt
+
+
+def _merge_all_layers():
+    return [{
+        'config': {'key{}'.format(i): layer for i in range(40)},
+        'resources': {'requests': {'cpu': layer}, 'limits': {'memory': layer}},
+        'args': ['--layer{}'.format(layer)],
+        'layer{}'.format(layer): {'x': layer},
+    } for layer in range(8)]
+
+
+def _merged_pairwise(layers):
+    ret = {}
+    for layer in layers:
+        ret = optionsmerger.merged(ret, layer)
+    return ret
+
+
+def _list_keys_docs():
+    keyed = Merger(list_keys={'env': 'name'})
+    base = {'env': [{'name': 'VAR{}'.format(i), 'value': str(i)} for i in range(500)]}
+    nxt = {'env': [{'name': 'VAR{}'.format(i), 'value': 'x'} for i in range(0, 500, 2)]}
+
+    # merging by hand, searching each item
+    def by_hand():
+        env = list(base['env'])
+        for item in nxt['env']:
+            for position, current in enumerate(env):
+                if current['name'] == item['name']:
+                    env[position] = merger.merged(current, item)
+                    break
+            else:
+                env.append(item)
+        return {'env': env}
+
+    return keyed, base, nxt, by_hand
+
+
+class TestMerger(unittest.TestCase):
+    def assertMergeEquivalent(self, fast, reference, base, nxt):
+        expected = _merge_result(reference.merge, copy.deepcopy(base), copy.deepcopy(nxt))
+        self.assertEqual(_merge_result(fast.merge, copy.deepcopy(base), copy.deepcopy(nxt)), expected,
+                         msg='{!r} <- {!r}'.format(base, nxt))
+
+    def test_merger_equivalence(self):
+        rnd = random.Random(42)
+        for _ in range(3000):
+            base = dict(_random_items(rnd, 0)) if rnd.randrange(5) else _random_value(rnd, 0)
+            nxt = dict(_random_items(rnd, 0)) if rnd.randrange(5) else _random_value(rnd, 0)
+            for fast, reference in [(merger, deepmerge_merger), (merger_nocreate, deepmerge_merger_nocreate),
+                                    (optionsmerger, deepmerge_optionsmerger)]:
+                self.assertMergeEquivalent(fast, reference, base, nxt)
+
+    def test_merger_errors(self):
+        with self.assertRaisesRegex(MergeError, r"^Type conflict at 'a.b': 1, 'x'$"):
+            merger.merge({'a': {'b': 1}}, {'a': {'b': 'x'}})
+        with self.assertRaisesRegex(MergeError, r"^Type conflict: \{\}, \[\]$"):
+            merger.merge({}, [])
+        with self.assertRaisesRegex(InvalidParamError, r'^Unknown option: "a.c"$'):
+            merger_nocreate.merge({'a': {'b': 1}}, {'a': {'b': 2, 'c': 3}})
+        with self.assertRaisesRegex(MergeError, r"^Type conflict at 'a.0': \[\], \{\}$"):
+            merger.value_strategy(['a'], {'0': []}, {'0': {}})
+        self.assertEqual(optionsmerger.merge({'a': OptionValue('x'), 'b': 1}, {'a': {'c': 1}, 'b': 'x'}),
+                         {'a': {'c': 1}, 'b': 'x'})
+
+    def test_merger_shares_like_deepmerge(self):
+        base = {'a': {'b': [1]}}
+        nxt = {'a': {'b': [2], 'c': {'d': 1}}, 'e': [3]}
+        result = merger.merge(base, nxt)
+        self.assertIs(result, base)
+        self.assertIs(result['a']['c'], nxt['a']['c'])
+        self.assertIs(result['e'], nxt['e'])
+        self.assertEqual(result['a']['b'], [1, 2])
+
+    def test_merger_benchmark_equivalence(self):
+        make_base, nxt = _benchmark_docs()
+        self.assertEqual(merger.merge(make_base(), nxt), deepmerge_merger.merge(make_base(), nxt))
+
+    @benchmark
+    def test_merger_benchmark(self):
+        make_base, nxt = _benchmark_docs()
+        report_timings('merge of a deployment-like document', 500,
+                       fast=lambda: merger.merge(make_base(), nxt),
+                       deepmerge=lambda: deepmerge_merger.merge(make_base(), nxt))
+
+    def test_merger_merged(self):
+        rnd = random.Random(7)
+        for _ in range(2000):
+            base = dict(_random_items(rnd, 0))
+            nxt = dict(_random_items(rnd, 0))
+            for fast in [merger, merger_nocreate, optionsmerger]:
+                base_before, nxt_before = _normalize(base), _normalize(nxt)
+                expected = _merge_result(fast.merge, copy.deepcopy(base), copy.deepcopy(nxt))
+                result = _merge_result(fast.merged, base, nxt)
+                self.assertEqual(result[:-1], expected[:-1], msg='{!r} <- {!r}'.format(base, nxt))
+                self.assertEqual(_normalize(base), base_before)
+                self.assertEqual(_normalize(nxt), nxt_before)
+
+        base = {'a': {'b': 1}, 'c': {'d': [1]}}
+        nxt = {'a': {'b': 2}, 'e': {'f': 1}}
+        result = merger.merged(base, nxt)
+        self.assertEqual(result, {'a': {'b': 2}, 'c': {'d': [1]}, 'e': {'f': 1}})
+        self.assertEqual(base, {'a': {'b': 1}, 'c': {'d': [1]}})
+        self.assertIs(result['c'], base['c'])
+        self.assertIs(result['e'], nxt['e'])
+        with self.assertRaisesRegex(InvalidParamError, r'^Unknown option: "a.c"$'):
+            merger_nocreate.merged({'a': {'b': 1}}, {'a': {'c': 3}})
+        with self.assertRaisesRegex(MergeError, r"^Type conflict at 'a': \{\}, 1$"):
+            merger.merged({'a': {}}, {'a': 1})
+
+    def test_merger_merge_all(self):
+        rnd = random.Random(11)
+        for _ in range(1000):
+            values = [dict(_random_items(rnd, 0)) if rnd.randrange(5) else _random_value(rnd, 0)
+                      for _ in range(rnd.randrange(1, 8))]
+            before = _normalize(values)
+            for fast, reference in [(optionsmerger, deepmerge_optionsmerger), (merger, deepmerge_merger),
+                                    (merger_nocreate, deepmerge_merger_nocreate)]:
+                def pairwise(items):
+                    ret = items[0]
+                    for item in items[1:]:
+                        ret = reference.merge(ret, item)
+                    return ret
+
+                expected = _merge_result(lambda a, b: pairwise(a), copy.deepcopy(values), None)
+                self.assertEqual(_merge_result(lambda a, b: fast.merge_all(a), values, None)[:-1], expected[:-1],
+                                 msg=repr(values))
+                self.assertEqual(_normalize(values), before)
+
+    def test_merger_merge_all_pairwise(self):
+        layers = _merge_all_layers()
+        before = copy.deepcopy(layers)
+        self.assertEqual(optionsmerger.merge_all([{}] + layers), _merged_pairwise(layers))
+        self.assertEqual(kway_merge(layers[::-1]), _merged_pairwise(layers))
+        self.assertEqual(layers, before)
+
+    @benchmark
+    def test_merger_merge_all_benchmark(self):
+        layers = _merge_all_layers()
+        report_timings('merge of 8 layers', 100, merge_all=lambda: optionsmerger.merge_all([{}] + layers),
+                       kway=lambda: kway_merge(layers[::-1]))
+
+    def test_merger_list_keys(self):
+        keyed = Merger(list_keys={'spec.containers': 'name', 'spec.containers.env': 'name'})
+        base = {'spec': {'containers': [
+            {'name': 'app', 'image': 'app:1', 'env': [{'name': 'A', 'value': '1'}], 'args': ['-v']},
+            {'name': 'sidecar', 'image': 'sidecar:1'},
+            'raw',
+        ]}}
+        nxt = {'spec': {'containers': [
+            {'name': 'app', 'image': 'app:2', 'env': [{'name': 'A', 'value': '2'}, {'name': 'B', 'value': '3'}],
+             'args': ['-q']},
+            {'name': 'new', 'image': 'new:1'},
+            {'image': 'unnamed'},
+            'raw',
+        ]}}
+        expected = {'spec': {'containers': [
+            {'name': 'app', 'image': 'app:2', 'env': [{'name': 'A', 'value': '2'}, {'name': 'B', 'value': '3'}],
+             'args': ['-v', '-q']},
+            {'name': 'sidecar', 'image': 'sidecar:1'},
+            'raw',
+            {'name': 'new', 'image': 'new:1'},
+            {'image': 'unnamed'},
+            'raw',
+        ]}}
+        before = copy.deepcopy(base)
+        self.assertEqual(keyed.merged(base, nxt), expected)
+        self.assertEqual(base, before)
+        self.assertEqual(keyed.merge_all([base, nxt, {'spec': {'containers': [{'name': 'new', 'image': 'new:2'}]}}])
+                         ['spec']['containers'][3], {'name': 'new', 'image': 'new:2'})
+        self.assertEqual(keyed.value_strategy(['spec'], copy.deepcopy(base['spec']), nxt['spec']), expected['spec'])
+        self.assertEqual(keyed.merge(base, nxt), expected)
+        # lists at other paths are appended
+        self.assertEqual(keyed.merge({'containers': [{'name': 'a'}]}, {'containers': [{'name': 'a'}]}),
+                         {'containers': [{'name': 'a'}, {'name': 'a'}]})
+        with self.assertRaisesRegex(MergeError, r"^Type conflict at 'spec.containers.app.image': 'x', 1$"):
+            keyed.merged({'spec': {'containers': [{'name': 'app', 'image': 'x'}]}},
+                         {'spec': {'containers': [{'name': 'app', 'image': 1}]}})
+
+    def test_merger_list_keys_by_hand(self):
+        keyed, base, nxt, by_hand = _list_keys_docs()
+        self.assertEqual(keyed.merged(base, nxt), by_hand())
+
+    @benchmark
+    def test_merger_list_keys_benchmark(self):
+        keyed, base, nxt, by_hand = _list_keys_docs()
+        report_timings('keyed merge of 500 items', 10, keyed=lambda: keyed.merged(base, nxt), by_hand=by_hand)
@@ -1,7 +1,18 @@
 import copy
+import pickle
 import unittest
 
-from kubragen2.options import Options, OptionValue, OptionsBuildData
+from kubragen2.build import BuildPlan, BuildObserver, BuildData
+from kubragen2.data import ValueData
+from kubragen2.exception import InvalidOperationError, InvalidParamError
+from kubragen2.option import OptionData
+from kubragen2.options import Options, LayeredOptions, FrozenOptions, OptionValue, OptionsBuildData, \
+    OptionsBuildDataBatch, OptionsBuildDataPlan
+from kubragen2.util import dict_has_name, dict_get_value
+
+
+class TaggedOptions(Options):
+    tag: str
 
 
 class TestUtil(unittest.TestCase):
@@ -27,3 +38,264 @@ class TestUtil(unittest.TestCase):
         })
         data = OptionsBuildData(options, copy.deepcopy(options.options))
         self.assertEqual(data, {'x': {'y': 14, 'z': 14}})
+
+    def test_option_build_batch(self):
+        options = Options({
+            'x': {
+                'z': 14,
+            }
+        })
+        data = OptionsBuildDataBatch(options, [{'y': OptionValue('x.z')} for _ in range(20)], max_workers=2)
+        self.assertEqual(data, [{'y': 14}] * 20)
+
+    def test_option_build_plan(self):
+        plan = BuildPlan({
+            'spec': {
+                'replicas': OptionValue('replicas'),
+                'image': ValueData(OptionValue('image')),
+            },
+            'metadata': {'name': 'x'},
+        })
+        for replicas in [1, 2]:
+            options = Options({'replicas': replicas, 'image': 'img{}'.format(replicas)})
+            self.assertEqual(OptionsBuildDataPlan(options, plan), {
+                'spec': {
+                    'replicas': replicas,
+                    'image': 'img{}'.format(replicas),
+                },
+                'metadata': {'name': 'x'},
+            })
+
+    def test_option_build_observer(self):
+        class Observer(BuildObserver):
+            stats = None
+
+            def build_finished(self, stats):
+                self.stats = stats
+
+        observer = Observer()
+        value = OptionValue('x')
+        data = OptionsBuildData(Options({'x': 1}), {'a': value, 'b': [value, ValueData(OptionValue('x'))]},
+                                observer=observer)
+        self.assertEqual(data, {'a': 1, 'b': [1, 1]})
+        self.assertEqual(observer.stats.option_lookups, 2)
+        self.assertEqual(observer.stats.data_resolved, 1)
+
+    def test_option_data(self):
+        class Observer(BuildObserver):
+            stats = None
+
+            def build_finished(self, stats):
+                self.stats = stats
+
+        data = {
+            'a': OptionData({'x': 1}, enabled_option='component.enabled'),
+            'b': [OptionData(value_option='component.replicas', value_func=lambda v: v * 2,
+                             enabled_option='component.enabled'), 5],
+            'c': OptionData('x', enabled_option='component.replicas', enabled_test=lambda v: v > 5),
+            'd': OptionData(OptionValue('component.replicas')),
+        }
+        observer = Observer()
+        options = Options({'component': {'enabled': True, 'replicas': 3}})
+        self.assertEqual(OptionsBuildData(options, data, in_place=False, observer=observer),
+                         {'a': {'x': 1}, 'b': [6, 5], 'd': 3})
+        self.assertEqual(observer.stats.option_lookups, 3)
+        self.assertEqual(OptionsBuildData(Options({'component': {'enabled': False, 'replicas': 3}}), data,
+                                          in_place=False), {'b': [5], 'd': 3})
+        with self.assertRaises(InvalidOperationError):
+            BuildData(data, in_place=False)
+
+    def test_option_index(self):
+        source = {
+            'a': {'b': {'c': 1}, 'l': ['x', 'y'], 's': 'text', 'n': None, 'i': 5},
+            'dotted.key': 2,
+            3: {'x': 1},
+            '': {'': 4},
+        }
+        options = Options(source)
+        names = ['a', 'a.b', 'a.b.c', 'a.b.d', 'a.l', 'a.l.x', 'a.l.z', 'a.s', 'a.s.t', 'a.s.z', 'a.n', 'a.n.x',
+                 'a.i.x', 'dotted.key', 'dotted', '3', '3.x', '', '.', 'z', 'z.y']
+        for name in names:
+            for method, func in [('has_option', dict_has_name), ('option_get', dict_get_value)]:
+                try:
+                    expected = func(source, name)
+                except Exception as e:
+                    with self.assertRaises(type(e), msg='{} {}'.format(method, name)):
+                        getattr(options, method)(name)
+                else:
+                    self.assertEqual(getattr(options, method)(name), expected, msg='{} {}'.format(method, name))
+        self.assertEqual(options.option_get_opt('a.n', 9), 9)
+        self.assertEqual(options.option_get_opt('a.b.d', 9), 9)
+        self.assertEqual(options.option_get_opt('a.l.z', 9), 9)
+        self.assertEqual(options.option_get_opt('a.b.c', 9), 1)
+
+    def test_option_index_refresh(self):
+        options = Options({'a': {'b': 1}})
+        self.assertEqual(options.option_get('a.b'), 1)
+        options.options = {'a': {'b': 2}}
+        self.assertEqual(options.option_get('a.b'), 2)
+        options.options['a']['c'] = 3
+        options.invalidate_cache()
+        self.assertEqual(options.option_get('a.c'), 3)
+
+    def test_option_value_memo(self):
+        lookups = []
+
+        class CountingOptions(Options):
+            def _lookup(self, name):
+                lookups.append(name)
+                return super()._lookup(name)
+
+        options = CountingOptions({'a': OptionValue('b'), 'b': OptionValue('c', str), 'c': 1})
+        self.assertEqual(options.option_get('a'), '1')
+        self.assertEqual(options.option_get('b'), '1')
+        self.assertEqual(OptionsBuildData(options, {'x': [OptionValue('a'), OptionValue('c')]}), {'x': ['1', 1]})
+        self.assertEqual(lookups.count('c'), 1)
+        self.assertEqual(lookups.count('b'), 2)
+        options.options = {'a': OptionValue('b'), 'b': 2}
+        self.assertEqual(options.option_get('a'), 2)
+
+    def test_option_value_cycle(self):
+        options = Options({'a': OptionValue('b.c'), 'b': {'c': OptionValue('a')}, 'd': OptionValue('d')})
+        with self.assertRaisesRegex(InvalidParamError, '"a -> b.c -> a"'):
+            options.option_get('a')
+        with self.assertRaisesRegex(InvalidParamError, '"b.c -> a -> b.c"'):
+            OptionsBuildData(options, {'x': OptionValue('b.c')})
+        with self.assertRaisesRegex(InvalidParamError, '"d -> d"'):
+            options.option_get_opt('d', 1)
+
+    def test_layered_options(self):
+        value1, value2 = OptionValue('a.b'), OptionValue('c.n')
+
+        def layers_copy(*extra):
+            # the Options merge changes the layers, the OptionValue instances are kept to compare the results
+            return copy.deepcopy(layers + list(extra), {id(value1): value1, id(value2): value2})
+
+        layers = [
+            {'a': {'b': 1, 'l': [1], 'd': {'x': 1}}, 'c': 'x', 'o': value1, 's': {'z': 1}},
+            None,
+            {'a': {'l': [2], 'd': None, 'e': {'y': 2}}, 'c': {'n': 1}, 'o': 5, 's': ['z']},
+            {'a': {'b': value2, 'd': {'w': 3}, 'l': [3]}, 'n': None},
+        ]
+        source = layers_copy()
+        options = LayeredOptions(*layers)
+        expected = Options(*layers_copy())
+        names = ['a', 'a.b', 'a.l', 'a.d', 'a.d.x', 'a.d.w', 'a.e.y', 'a.z', 'c', 'c.n', 'o', 'n', 'n.x', 's',
+                 's.z', 's.y', 'x', 'x.y']
+        for name in names:
+            for method, args in [('has_option', ()), ('option_get', ()), ('option_get_opt', ('default',))]:
+                try:
+                    value = getattr(expected, method)(name, *args)
+                except Exception as e:
+                    with self.assertRaises(type(e), msg='{} {}'.format(method, name)):
+                        getattr(options, method)(name, *args)
+                else:
+                    self.assertEqual(getattr(options, method)(name, *args), value, msg='{} {}'.format(method, name))
+        with self.assertRaisesRegex(InvalidParamError, 'Could not find item "a.z"'):
+            options.option_get('a.z')
+        self.assertEqual(options.options, expected.options)
+        self.assertEqual(layers, source)
+
+        derived = options.derive({'a': {'l': [4], 'b': 7}})
+        self.assertEqual(derived.option_get('a.l'), [1, 2, 3, 4])
+        self.assertEqual(derived.option_get('a.b'), 7)
+        self.assertEqual(options.option_get('a.b'), 1)
+        self.assertIs(derived.layers[0], options.layers[0])
+        self.assertEqual(derived.options, Options(*layers_copy({'a': {'l': [4], 'b': 7}})).options)
+        self.assertEqual(layers, source)
+
+    def test_frozen_options(self):
+        source = {'a': {'b': [1, 2], 'c': OptionValue('d', str)}, 'd': 5, 'e': OptionValue('a.b')}
+        options = Options(source)
+        frozen = options.freeze()
+        self.assertEqual(frozen.option_get('a.c'), '5')
+        self.assertEqual(frozen.option_get_opt('x', 1), 1)
+        frozen.option_get('a.b').append(3)
+        frozen.option_get('e').append(3)
+        self.assertEqual(frozen.option_get('a.b'), [1, 2])
+        self.assertEqual(OptionsBuildData(frozen, {'x': OptionValue('e')}), {'x': [1, 2]})
+        source['a']['b'].append(4)
+        self.assertEqual(frozen.option_get('a.b'), [1, 2])
+        with self.assertRaises(InvalidOperationError):
+            frozen.options = {}
+        with self.assertRaises(TypeError):
+            frozen.options['d'] = 6
+
+        fingerprint = frozen.fingerprint
+        self.assertEqual(len(fingerprint), 64)
+        same = FrozenOptions({'e': OptionValue('a.b'), 'd': 5}, {'a': {'c': OptionValue('d', str), 'b': [1, 2]}})
+        self.assertEqual(same.fingerprint, fingerprint)
+        self.assertEqual(same, frozen)
+        self.assertEqual(len({same, frozen}), 1)
+        self.assertEqual(pickle.loads(pickle.dumps(frozen)).fingerprint, fingerprint)
+        for other in [{'a': {'b': [2, 1], 'c': OptionValue('d', str)}, 'd': 5, 'e': OptionValue('a.b')},
+                      {'a': {'b': [1, 2], 'c': OptionValue('d')}, 'd': 5, 'e': OptionValue('a.b')},
+                      {'a': {'b': [1, 2], 'c': OptionValue('d', str)}, 'd': '5', 'e': OptionValue('a.b')},
+                      {'a': {'b': [1, 2], 'c': OptionValue('d', str)}, 'd': 5, 'e': OptionValue('a')}]:
+            self.assertNotEqual(FrozenOptions(other).fingerprint, fingerprint)
+
+    def test_frozen_options_fingerprint_containers(self):
+        def fingerprint(value):
+            return FrozenOptions({'a': value}).fingerprint
+
+        self.assertNotEqual(fingerprint([1, 2]), fingerprint((1, 2)))
+        # 8 and 16 collide in a small set, so the iteration order follows the insertion order
+        self.assertNotEqual(list({8, 16}), list({16, 8}))
+        self.assertEqual(fingerprint({8, 16}), fingerprint({16, 8}))
+        self.assertEqual(fingerprint({8, 16}), fingerprint(frozenset([16, 8])))
+        self.assertNotEqual(fingerprint({8, 16}), fingerprint([8, 16]))
+        self.assertNotEqual(fingerprint({8, 16}), fingerprint({8, 17}))
+
+    def test_option_get_opt_many(self):
+        source = {
+            'config': {'a': 1, 'b': None, 'c': {'d': OptionValue('other')}, 'e': '', 'l': ['x']},
+            'other': 'o',
+            'scalar': 'text',
+        }
+        defaults = {'a': 0, 'b': 2, 'c.d': 3, 'e': 4, 'f': 5, 'c.x': 6}
+        for options in [Options(source), LayeredOptions({'config': {'a': 9}}, source), FrozenOptions(source)]:
+            self.assertEqual(options.option_get_opt_many(defaults, prefix='config'),
+                             {'a': 1, 'b': 2, 'c.d': 'o', 'e': 4, 'f': 5, 'c.x': 6})
+            self.assertEqual(options.option_get_opt_many({'config.a': 0, 'x': 1}), {'config.a': 1, 'x': 1})
+            self.assertEqual(options.option_get_opt_many({'a': 1}, prefix='missing'), {'a': 1})
+            self.assertEqual(options.option_get_opt_many({'q': 1, 'z': 2}, prefix='scalar'), {'q': 1, 'z': 2})
+            with self.assertRaises(AttributeError):
+                options.option_get_opt_many({'t': 1}, prefix='scalar')
+            self.assertEqual(options.option_get_opt_many({'a': 1, 'b': 2}, prefix='config', empty_values=[1]),
+                             {'a': 1, 'b': None})
+
+    def test_options_layers_unchanged(self):
+        defaults = {'a': {'b': 1, 'l': [1]}, 'c': OptionValue('a.b')}
+        config = {'a': {'b': 2, 'l': [2], 'n': {'x': 1}}, 'c': {'d': 3}}
+        options = Options(defaults, None, config, {'a': {'n': {'y': 2}}})
+        self.assertEqual(options.options, {'a': {'b': 2, 'l': [1, 2], 'n': {'x': 1, 'y': 2}}, 'c': {'d': 3}})
+        self.assertEqual(defaults, {'a': {'b': 1, 'l': [1]}, 'c': defaults['c']})
+        self.assertEqual(config, {'a': {'b': 2, 'l': [2], 'n': {'x': 1}}, 'c': {'d': 3}})
+
+    def test_options_changed_in_place(self):
+        options = Options({'a': {'b': 1, 'c': {'d': 2}}, 'e': OptionValue('a.b'), 'f': OptionValue('e')})
+        self.assertEqual(options.option_get('a.b'), 1)
+        self.assertEqual(options.option_get('f'), 1)
+        options.options['a']['b'] = 2
+        self.assertEqual(options.option_get('a.b'), 2)
+        self.assertEqual(options.option_get('f'), 2)
+        options.options['a'] = {'b': 3}
+        self.assertEqual(options.option_get('a.b'), 3)
+        self.assertFalse(options.has_option('a.c.d'))
+        self.assertEqual(options.option_get('e'), 3)
+        options.options['a']['x'] = 4
+        self.assertEqual(options.option_get_opt('a.x', 0), 4)
+        del options.options['a']['b']
+        self.assertEqual(options.option_get_opt('a.b', 5), 5)
+
+    def test_options_pickle_subclass(self):
+        options = TaggedOptions({'a': 1})
+        options.tag = 'x'
+        self.assertEqual(options.option_get('a'), 1)
+        for loaded in [pickle.loads(pickle.dumps(options)), copy.copy(options)]:
+            self.assertEqual(loaded.tag, 'x')
+            self.assertEqual(loaded.option_get('a'), 1)
+        layered = LayeredOptions({'a': 1}, {'a': 2})
+        layered.tag = 'y'
+        self.assertEqual(pickle.loads(pickle.dumps(layered)).tag, 'y')
+        self.assertEqual(pickle.loads(pickle.dumps(layered)).option_get('a'), 2)
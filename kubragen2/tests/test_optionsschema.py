@@ -0,0 +1,59 @@
+import unittest
+
+from kubragen2.data import ValueData
+from kubragen2.exception import OptionsSchemaError, InvalidParamError
+from kubragen2.merger import merger_nocreate
+from kubragen2.option import OptionValue
+from kubragen2.optionsschema import OptionsSchema, SchemaValue
+
+
+class TestOptionsSchema(unittest.TestCase):
+    def setUp(self):
+        self.schema = OptionsSchema({
+            'namespace': 'default',
+            'basename': SchemaValue(str, required=True),
+            'config': {
+                'replicas': 1,
+                'ratio': 0.5,
+                'image': None,
+                'args': ['--verbose'],
+                'labels': SchemaValue(dict),
+            },
+            'enabled': SchemaValue((bool, str), default=True),
+        })
+
+    def test_schema_valid(self):
+        options = self.schema.build_options({'basename': 'app', 'config': {'replicas': 3, 'args': ['--x'],
+                                                                          'labels': {'a': 'b'}}},
+                                            {'namespace': OptionValue('basename'), 'enabled': ValueData(False)})
+        self.assertEqual(options.option_get('namespace'), 'app')
+        self.assertEqual(options.option_get('config.replicas'), 3)
+        self.assertEqual(options.option_get('config.ratio'), 0.5)
+        self.assertEqual(options.option_get('config.args'), ['--verbose', '--x'])
+        self.assertEqual(options.option_get('config.labels'), {'a': 'b'})
+        self.assertEqual(self.schema.defaults()['config']['args'], ['--verbose'])
+
+    def test_schema_errors(self):
+        with self.assertRaises(OptionsSchemaError) as cm:
+            self.schema.build_options({'config': {'replicas': 'x', 'ratio': 1, 'args': 'a', 'extra': 1},
+                                       'enabled': 1, 'other': {}}, None, {'config': 5})
+        self.assertIsInstance(cm.exception, InvalidParamError)
+        self.assertEqual(cm.exception.errors, [
+            'Unknown option: "other"',
+            'Unknown option: "config.extra"',
+            'Invalid type for option "config.replicas": expected int, got str',
+            'Invalid type for option "config.ratio": expected float, got int',
+            'Invalid type for option "config.args": expected list, got str',
+            'Invalid type for option "enabled": expected bool or str, got int',
+            'Invalid type for option "config": expected Mapping, got int',
+            'Missing required option: "basename"',
+        ])
+
+    def test_schema_unknown_as_merger_nocreate(self):
+        defaults = {'a': 1, 'b': {'c': 2, 'd': {}}}
+        schema = OptionsSchema(defaults)
+        for value in [{'x': 1}, {'b': {'x': 1}}, {'b': {'d': {'x': 1}}}]:
+            with self.assertRaises(InvalidParamError) as cm:
+                merger_nocreate.merge({'a': 1, 'b': {'c': 2, 'd': {}}}, value)
+            self.assertEqual(schema.validate(value), [str(cm.exception)])
+        self.assertEqual(schema.validate({'a': True, 'b': {'c': None}}), [])
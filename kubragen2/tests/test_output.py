@@ -0,0 +1,72 @@
+import unittest
+
+from kubragen2.build import IterBuildData
+from kubragen2.data import ValueData
+from kubragen2.output import OutputFile_Kubernetes, OutputDataDumper, OutputDriver, OutputProject, \
+    OutputFile_ShellScript
+
+
+class TestOutput(unittest.TestCase):
+    def test_output_extend(self):
+        consumed = []
+
+        def documents():
+            for i in range(2):
+                consumed.append(i)
+                yield {'kind': 'ConfigMap', 'data': {'x': ValueData(str(i))}}
+
+        file = OutputFile_Kubernetes('test.yaml')
+        file.append({'kind': 'Namespace'})
+        file.extend(IterBuildData(documents()))
+        self.assertEqual(consumed, [])
+        self.assertEqual(file.to_string(OutputDataDumper()),
+                         "kind: Namespace\n\n---\nkind: ConfigMap\ndata:\n  x: '0'\n\n---\nkind: ConfigMap\ndata:\n  x: '1'\n")
+        self.assertEqual(consumed, [0, 1])
+
+    def test_output_extend_reverse(self):
+        file = OutputFile_Kubernetes('test.yaml', reverse=True)
+        file.extend(IterBuildData([{'x': 1}, {'x': 2}]))
+        self.assertEqual(file.data, [{'x': 2}, {'x': 1}])
+
+    def test_output_project_streams_chunks(self):
+        consumed = []
+
+        def documents():
+            for i in range(3):
+                consumed.append(i)
+                yield {'x': i}
+
+        class ChunkDriver(OutputDriver):
+            def __init__(self):
+                self.chunks = []
+
+            def write_file_chunks(self, file, filename, chunks):
+                for chunk in chunks:
+                    self.chunks.append((len(consumed), chunk))
+
+        file = OutputFile_Kubernetes('test.yaml')
+        file.extend(documents())
+        expected = OutputFile_Kubernetes('test.yaml')
+        expected.extend(documents())
+        expected = expected.to_string(OutputDataDumper())
+        consumed.clear()
+        project = OutputProject()
+        project.append(file)
+        driver = ChunkDriver()
+        project.output(driver)
+        self.assertEqual(''.join(chunk for _, chunk in driver.chunks), expected)
+        self.assertEqual(driver.chunks[0], (1, 'x: 0\n'))
+
+    def test_output_project_default_driver(self):
+        class StringDriver(OutputDriver):
+            def write_file(self, file, filename, filecontents):
+                self.contents = filecontents
+
+        file = OutputFile_ShellScript('test.sh')
+        file.append('echo 1')
+        file.append('echo 2')
+        project = OutputProject()
+        project.append(file)
+        driver = StringDriver()
+        project.output(driver)
+        self.assertEqual(driver.contents, '#!/bin/bash\n\necho 1\necho 2\n')
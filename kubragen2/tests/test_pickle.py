@@ -0,0 +1,97 @@
+import concurrent.futures
+import pickle
+import unittest
+
+from kubragen2.build import BuildData
+from kubragen2.data import ValueData, DisabledData, DISABLED_DATA
+from kubragen2.kdata import KData_Manual, KData_Value, KData_ConfigMap, KData_Secret, KData_Env, \
+    KData_StorageClass, KData_PersistentVolume_Request, KData_PersistentVolumeClaim_Request, \
+    KData_PersistentVolume_HostPath, KData_PersistentVolume_CSI, KData_PersistentVolumeClaim
+from kubragen2.option import OptionValue
+from kubragen2.options import Options, OptionsBuildData
+from kubragen2.output import OutputFile_Kubernetes, OutputProject, OD_FileTemplate
+from kubragen2.provider.aws import KData_PersistentVolume_AWSElasticBlockStore
+from kubragen2.provider.digitalocean import KData_PersistentVolume_CSI_DOBS
+
+
+class _DefaultValueData(ValueData):
+    __slots__ = ()
+
+
+def _roundtrip_chunk(data):
+    return pickle.loads(pickle.dumps(data))
+
+
+class TestPickle(unittest.TestCase):
+    def assertRoundtrip(self, value):
+        dumped = pickle.dumps(value)
+        loaded = pickle.loads(dumped)
+        self.assertIs(type(loaded), type(value))
+        self.assertEqual(pickle.dumps(loaded), dumped)
+        return loaded
+
+    def test_pickle_data(self):
+        self.assertIs(pickle.loads(pickle.dumps(DISABLED_DATA)), DISABLED_DATA)
+        self.assertIsNot(self.assertRoundtrip(DisabledData()), DISABLED_DATA)
+        loaded = self.assertRoundtrip(ValueData({'a': 1}, enabled=False))
+        self.assertEqual(loaded.value, {'a': 1})
+        self.assertFalse(loaded.enabled)
+        for value in [KData_Manual({'a': 1}), KData_Value(1), KData_ConfigMap('cm', 'data'),
+                      KData_Secret('secret', 'data'), KData_Env('name', KData_Value(2)),
+                      KData_StorageClass('sc'), OptionValue('a.b'), OptionValue('a.b', str)]:
+            self.assertRoundtrip(value)
+
+    def test_pickle_compact(self):
+        items = [ValueData(i) for i in range(100)]
+        default_items = [_DefaultValueData(i) for i in range(100)]
+        self.assertLess(len(pickle.dumps(items)), len(pickle.dumps(default_items)))
+
+    def test_pickle_options(self):
+        options = Options({'a': {'b': OptionValue('c'), 'x': [1]}, 'c': 5}, {'a': {'x': [2]}})
+        loaded = self.assertRoundtrip(options)
+        self.assertEqual(loaded.option_get('a.b'), 5)
+        self.assertEqual(loaded.option_get('a.x'), [1, 2])
+
+    def test_pickle_persistentvolume(self):
+        pvreq = KData_PersistentVolume_Request('pv', storage='1Gi', access_modes=['ReadWriteOnce'], configs=[
+            KData_PersistentVolume_HostPath.Config({'path': '/data'}),
+            KData_PersistentVolume_AWSElasticBlockStore.Config(volumeID='vol'),
+        ])
+        pvcreq = KData_PersistentVolumeClaim_Request('pvc', 'default', pvreq=pvreq)
+        for value in [pvreq, pvcreq, KData_PersistentVolume_HostPath(), KData_PersistentVolume_CSI(),
+                      KData_PersistentVolume_AWSElasticBlockStore(), KData_PersistentVolume_CSI_DOBS(),
+                      KData_PersistentVolumeClaim()]:
+            self.assertRoundtrip(value)
+        self.assertEqual(pickle.loads(pickle.dumps(KData_PersistentVolume_HostPath())).build(pvreq),
+                         KData_PersistentVolume_HostPath().build(pvreq))
+        built = KData_PersistentVolume_HostPath()
+        built.build(pvreq)
+        self.assertEqual(pickle.dumps(built), pickle.dumps(KData_PersistentVolume_HostPath()))
+
+    def test_pickle_output(self):
+        file = OutputFile_Kubernetes('app.yaml')
+        file.append({'a': 1})
+        file.extend(iter([{'b': OD_FileTemplate('${FILE_x}')}]))
+        project = OutputProject()
+        project.append(file)
+        loaded = self.assertRoundtrip(project)
+        self.assertEqual(loaded.out_sequence[0].fileid, file.fileid)
+        self.assertEqual(list(loaded.out_sequence[0].iter_data()), [{'a': 1}, {'b': '${FILE_x}'}])
+
+    def test_pickle_process_pool(self):
+        options = Options({'replicas': 3})
+        data = [{
+            'name': ValueData('x{}'.format(i)),
+            'replicas': OptionValue('replicas'),
+            'env': [ValueData('A'), ValueData(i, enabled=i % 2 == 0)],
+            'configmap': KData_Env('A', KData_ConfigMap('cm', 'a')),
+            'disabled': DISABLED_DATA,
+        } for i in range(2500)]
+        chunks = [data[i:i + 500] for i in range(0, len(data), 500)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+            result = [item for chunk in executor.map(_roundtrip_chunk, chunks) for item in chunk]
+        self.assertEqual(len(result), len(data))
+        self.assertIs(result[0]['disabled'], DISABLED_DATA)
+        self.assertEqual(OptionsBuildData(options, {'replicas': result[10]['replicas']})['replicas'], 3)
+        self.assertEqual(BuildData(result[11]['env'], in_place=False), ['A'])
+        self.assertEqual(result[11]['configmap'].value.configmapName, 'cm')